@@ -2,8 +2,8 @@ import logging
 import bcrypt
 import sqlite3
 import base64
-from backend.services.databaseService import DATABASE_PATH
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from backend.services.databaseService import DATABASE_PATH, get_connection
+from fastapi import APIRouter, Query, UploadFile, File, HTTPException
 from pydantic import BaseModel, EmailStr
 from backend.services.candidateService import get_candidate, verify_candidate_password, register_new_candidate
 from backend.controllers.candidateController import (
@@ -11,6 +11,7 @@ from backend.controllers.candidateController import (
     recognize_candidate_from_base64,
     recognize_candidate,
 )
+from backend.services.workerPoolService import run_in_pool
 
 # ✅ Setup Logging
 logging.basicConfig(
@@ -60,6 +61,8 @@ async def recognize_candidate_endpoint(file: UploadFile = File(...)):
     """Recognizes a candidate using KNN face matching from a file upload."""
     try:
         return await recognize_candidate(file)
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logging.error(f"❌ Candidate face recognition error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Candidate face recognition error: {str(e)}")
@@ -69,7 +72,9 @@ async def recognize_candidate_endpoint(file: UploadFile = File(...)):
 async def recognize_candidate_base64_api(request: Base64ImageRequest):
     """Recognizes a candidate using KNN face matching from a Base64-encoded image."""
     try:
-        return recognize_candidate_from_base64(request.image_base64)
+        return await run_in_pool(recognize_candidate_from_base64, request.image_base64)
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logging.error(f"❌ Error recognizing candidate from base64: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error recognizing candidate: {str(e)}")
@@ -132,13 +137,18 @@ async def verify_candidate_password_api(verify_request: CandidatePasswordVerific
 
 
 @router.get("/get_all_candidates")
-async def get_all_candidates():
+async def get_all_candidates(include_images: bool = Query(True, description="Set false to list candidates without loading their photos.")):
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT universityID, firstname, lastname, aboutYourself, image FROM candidates")
+        if include_images:
+            cursor.execute("""
+                SELECT candidates.universityID, candidates.firstname, candidates.lastname, candidates.aboutYourself, face_images.image
+                FROM candidates LEFT JOIN face_images ON face_images.hash = candidates.image_hash
+            """)
+        else:
+            cursor.execute("SELECT universityID, firstname, lastname, aboutYourself, NULL FROM candidates")
         candidates = cursor.fetchall()
-        conn.close()
 
         if not candidates:
             return {"status": "error", "message": "No candidates found."}
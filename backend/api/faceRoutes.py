@@ -8,7 +8,12 @@ from backend.controllers.faceController import (
     register_new_voter,
 )
 #from backend.services.faceRecognitionService import recognize_face_live
-from backend.services.candidateService import register_new_candidate
+from backend.services.candidateService import register_new_candidate, update_candidate_dataset_and_train
+from backend.services.voterService import update_face_dataset_and_train
+from backend.services.faceRecognitionService import reload_voter_gallery, voter_model_version
+from backend.services.candidateRecognitionService import reload_candidate_gallery, candidate_model_version
+from backend.services.workerPoolService import run_in_pool, recognition_pool
+from backend.services.modelRegistryService import memory_footprint
 
 router = APIRouter()
 
@@ -51,6 +56,8 @@ async def recognize_endpoint(file: UploadFile = File(...)):
     """Recognizes a voter using KNN face matching from a file upload."""
     try:
         return await recognize_user(file)  # Ensure recognize_user exists in faceController.py
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Face recognition error: {str(e)}")
 
@@ -59,7 +66,9 @@ async def recognize_endpoint(file: UploadFile = File(...)):
 async def recognize_face_base64_api(request: Base64ImageRequest):
     """Recognizes a voter using KNN face matching from a Base64-encoded image."""
     try:
-        return recognize_face_from_base64(request.image_base64)
+        return await run_in_pool(recognize_face_from_base64, request.image_base64)
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error recognizing face: {str(e)}")
 
@@ -69,9 +78,47 @@ async def liveness_endpoint(file: UploadFile = File(...)):
     """Performs a liveness test to verify if the user is real (blink detection)."""
     try:
         return await perform_liveness_check(file)
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Liveness check error: {str(e)}")
 
+# ✅ On-Demand Full Gallery Rebuild (registration enrolls incrementally)
+@router.post("/rebuild_gallery")
+async def rebuild_gallery_endpoint(target: str = "voters"):
+    """Re-embeds every stored voter or candidate face and swaps in the rebuilt gallery."""
+    rebuilders = {"voters": update_face_dataset_and_train, "candidates": update_candidate_dataset_and_train}
+    if target not in rebuilders:
+        raise HTTPException(status_code=400, detail="target must be 'voters' or 'candidates'")
+    return await run_in_pool(rebuilders[target], timeout=3600)
+
+# ✅ Hot Reload of the Saved Gallery (no restart, no request downtime)
+@router.post("/reload_gallery")
+async def reload_gallery_endpoint(target: str = "voters"):
+    """Loads the latest saved voter or candidate gallery in the background and swaps it in atomically."""
+    reloaders = {"voters": reload_voter_gallery, "candidates": reload_candidate_gallery}
+    if target not in reloaders:
+        raise HTTPException(status_code=400, detail="target must be 'voters' or 'candidates'")
+    return await run_in_pool(reloaders[target], timeout=600)
+
+# ✅ Active Gallery Versions
+@router.get("/model_version")
+async def model_version_endpoint():
+    """Reports the gallery versions currently serving recognition requests."""
+    return {"status": "success", "voters": voter_model_version(), "candidates": candidate_model_version()}
+
+# ✅ Recognition Worker Pool Metrics
+@router.get("/pool")
+async def recognition_pool_stats():
+    """Reports worker count, queue depth and completed / timed-out requests of the recognition pool."""
+    return {"status": "success", "pool": recognition_pool.stats()}
+
+# ✅ Loaded Model Footprint
+@router.get("/models")
+async def loaded_models():
+    """Lists the models loaded in this process with their approximate memory footprint."""
+    return {"status": "success", **memory_footprint()}
+
 # ✅ Real-Time Face Recognition (Webcam)
 @router.get("/real_time_recognition")
 async def real_time_face_recognition():
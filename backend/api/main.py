@@ -16,6 +16,11 @@ from backend.api.voterRoutes import router as voter_router
 from backend.api.faceRoutes import router as face_router
 from backend.api.voteRoutes import router as vote_router
 from backend.api.candidateRoutes import router as candidate_router
+from backend.services.modelRegistryService import preload, warmup
+from backend.services.faceGalleryService import gallery_watcher
+from backend.services.enrollmentQueueService import enrollment_worker
+from backend.services.databaseService import migrate_inline_images
+from backend.services.voteWriterService import initialize_tallies
 
 # ✅ Initialize FastAPI app
 app = FastAPI()
@@ -51,6 +56,29 @@ app.include_router(voter_router, prefix="/api/voter", tags=["Voter Management"])
 app.include_router(candidate_router, prefix="/api/candidate", tags=["Candidate Management"]) #Candidate
 app.include_router(voter_router, prefix="/api/voter", tags=["Admin Management"])  # ✅ FIXED Missing Route
 
+# 🗄️ Upgrade `voters.db` Before Any Request Reads It (photos → `face_images`, running `tallies`)
+@app.on_event("startup")
+def upgrade_database():
+    migrate_inline_images("voters")
+    migrate_inline_images("candidates")
+    initialize_tallies()
+
+# 🔥 Load & Warm Up Shared Models Once per Process (see UNIVOTE_PRELOAD_MODELS)
+@app.on_event("startup")
+def preload_models():
+    preload()
+    warmup()
+
+# 🔄 Hot-Reload Galleries Rewritten by Other Workers or Training Scripts
+@app.on_event("startup")
+def start_gallery_watcher():
+    gallery_watcher.start()
+
+# 🧬 Drain Face Enrollments Queued by Registration (including jobs left over from the last run)
+@app.on_event("startup")
+def start_enrollment_worker():
+    enrollment_worker.start()
+
 # 📌 Root Endpoint
 @app.get("/")
 def home():
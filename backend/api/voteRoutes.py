@@ -1,9 +1,12 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Query, Header
+from fastapi.responses import JSONResponse, Response
+from typing import Optional
 from starlette.responses import StreamingResponse
 import asyncio
 import aiofiles
 from backend.services.voteService import cast_vote , get_results # ✅ Import from voteService
+from backend.services.workerPoolService import run_in_pool, NO_TIMEOUT
+from backend.services.voteWriterService import vote_writer
 import os
 import base64
 import cv2
@@ -47,7 +50,9 @@ async def cast_vote_api(
             "image_path": file_path  # Pass file path instead of Base64
         }
 
-        response = cast_vote(vote_data)  
+        # ✅ Off the event loop, without a timeout: a running cast cannot be cancelled and may still
+        #    commit the vote, so reporting it as timed out would invite a retry that says "already voted"
+        response = await run_in_pool(cast_vote, vote_data, timeout=NO_TIMEOUT)
 
        # if response["status"] == "success":
         return response  # ✅ Vote successfully cast
@@ -60,21 +65,40 @@ async def cast_vote_api(
 
 
 @router.get("/results")
-async def get_results_api():
+async def get_results_api(
+    version: Optional[int] = Query(None, description="Tally version the client already has."),
+    if_none_match: Optional[str] = Header(None),
+):
     """
     Retrieve and return the election results.
+    Pollers pass the last `version` (or its ETag in If-None-Match) and get 304 Not Modified until a vote lands.
     """
     try:
-        response = get_results()
+        tag = (if_none_match or "").strip('W/"')
+        if version is None and tag.isdigit():
+            version = int(tag)
+        response = await run_in_pool(get_results, since_version=version)  # SQLite reads stay off the event loop
+        etag = f'"{response["version"]}"'
+
+        if response["status"] == "not_modified":
+            return Response(status_code=304, headers={"ETag": etag})
 
         if response["status"] == "success":
-            return response
+            return JSONResponse(content=response, headers={"ETag": etag})
 
         raise HTTPException(status_code=400, detail=response["message"])
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Server Error: {str(e)}")
 
+# ✅ Vote Writer Metrics
+@router.get("/writer")
+async def vote_writer_stats():
+    """Reports group-commit batch sizes, throughput and p50 / p99 vote latency for tuning the batching window."""
+    return {"status": "success", "writer": vote_writer.stats()}
+
 #Existing Logs
 async def read_existing_logs():
     """Reads all existing logs from the log file."""
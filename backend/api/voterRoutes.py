@@ -1,6 +1,9 @@
-from fastapi import APIRouter, Query,  HTTPException
+from fastapi import APIRouter, Query,  HTTPException, UploadFile, File
 from pydantic import BaseModel, EmailStr, Field
 from backend.services.voterService import get_voter_details, register_new_voter
+from backend.services.enrollmentQueueService import enrollment_worker
+from backend.services.bulkImportService import import_voters
+from backend.services.workerPoolService import run_in_pool
 from backend.services.authService import verify_password
 import logging
 import bcrypt
@@ -8,11 +11,22 @@ import sqlite3
 from typing import Optional
 import base64
 import os
+import shutil
+import tempfile
+import zipfile
+from backend.services.databaseService import get_connection
 
 
 # ✅ Database Path
 DATABASE_PATH = "backend/data/voters.db"
 
+# ✅ Voter Listing Queries (the `voters` scan stays compact; photo bytes live in `face_images`)
+VOTER_LIST_QUERY = "SELECT universityID, firstname, lastname, email, NULL FROM voters"
+VOTER_LIST_WITH_IMAGES_QUERY = """
+    SELECT voters.universityID, voters.firstname, voters.lastname, voters.email, face_images.image FROM voters
+    LEFT JOIN face_images ON face_images.hash = voters.image_hash
+"""
+
 # ✅ Setup Logging
 logging.basicConfig(
     filename="backend/logs/voter_logs.log",
@@ -46,7 +60,7 @@ class PasswordVerificationModel(BaseModel):
 @router.post("/register")
 async def register_voter_endpoint(voter: VoterRegistrationModel):
     """
-    Registers a new voter and automatically updates the face recognition dataset.
+    Registers a new voter and queues face enrollment; poll `/enrollment/{enrollment_job}` for its progress.
     """
     try:
         # ✅ Convert Pydantic Model to Dictionary
@@ -64,17 +78,54 @@ async def register_voter_endpoint(voter: VoterRegistrationModel):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error registering voter: {str(e)}")
 
+# ✅ Bulk Import API (roster file + photo archive)
+@router.post("/bulk_import")
+async def bulk_import_endpoint(roster: UploadFile = File(...), images: UploadFile = File(...)):
+    """
+    Registers a whole roster (CSV or JSONL) with photos from a .zip archive and builds the gallery once.
+    Returns the number imported plus one entry per failed row.
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        roster_path = os.path.join(workdir, os.path.basename(roster.filename or "roster.csv"))
+        images_path = os.path.join(workdir, "images.zip")
+        for upload, path in ((roster, roster_path), (images, images_path)):
+            with open(path, "wb") as f:
+                shutil.copyfileobj(upload.file, f)
+        if not zipfile.is_zipfile(images_path):
+            raise HTTPException(status_code=400, detail="`images` must be a .zip archive of the roster photos.")
+
+        try:
+            return await run_in_pool(import_voters, roster_path, images_path, timeout=3600)
+        except TimeoutError as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except (ValueError, KeyError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid roster: {str(e)}")
+
+# ✅ Enrollment Job Status API
+@router.get("/enrollment/{job_id}")
+async def get_enrollment_status(job_id: int):
+    """
+    Reports the progress of a face enrollment queued by `/register` (queued, running, done or failed).
+    """
+    job = enrollment_worker.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Enrollment job not found")
+    return job
+
 # ✅ Retrieve Voter API
 @router.post("/get_voter")
 async def get_voter(data: VoterLookupModel):
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
 
         # ✅ Fetch voter details including image
-        cursor.execute("SELECT universityID, firstname, lastname, email, image FROM voters WHERE universityID=?", (data.universityID,))
+        cursor.execute("""
+            SELECT voters.universityID, voters.firstname, voters.lastname, voters.email, face_images.image FROM voters
+            LEFT JOIN face_images ON face_images.hash = voters.image_hash
+            WHERE voters.universityID=?
+        """, (data.universityID,))
         voter = cursor.fetchone()
-        conn.close()
 
         if not voter:
             raise HTTPException(status_code=404, detail="Voter not found")
@@ -104,7 +155,7 @@ async def get_voter(data: VoterLookupModel):
 
 def get_voter_password(universityID):
     try:
-        with sqlite3.connect(DATABASE_PATH) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT password FROM voters WHERE universityID=?", (universityID,))
             result = cursor.fetchone()
@@ -150,15 +201,14 @@ async def verify_password_endpoint(data: PasswordVerificationModel):
 
 # ✅ Retrieve All Voters
 @router.get("/get_voters")
-async def get_voters():
+async def get_voters(include_images: bool = Query(True, description="Set false to list voters without loading their photos.")):
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
 
-        # ✅ Fetch voter details including image
-        cursor.execute("SELECT universityID, firstname, lastname, email, image FROM voters")
+        # ✅ Fetch voter details (photos are joined in from the image store only when requested)
+        cursor.execute(VOTER_LIST_WITH_IMAGES_QUERY if include_images else VOTER_LIST_QUERY)
         voters = cursor.fetchall()
-        conn.close()
 
         if not voters:
             return {"status": "error", "message": "No voters found."}
@@ -182,15 +232,14 @@ async def get_voters():
         raise HTTPException(status_code=500, detail="Database error while fetching voters.")
 
 @router.get("/get_voters")
-async def get_voters():
+async def get_voters(include_images: bool = Query(True, description="Set false to list voters without loading their photos.")):
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
 
-        # ✅ Fetch voter details including the image
-        cursor.execute("SELECT universityID, firstname, lastname, email, image FROM voters")
+        # ✅ Fetch voter details (photos are joined in from the image store only when requested)
+        cursor.execute(VOTER_LIST_WITH_IMAGES_QUERY if include_images else VOTER_LIST_QUERY)
         voters = cursor.fetchall()
-        conn.close()
 
         if not voters:
             return {"status": "error", "message": "No voters found."}
@@ -5,10 +5,12 @@ import base64
 import time
 import sqlite3
 from backend.services.livenessService import is_live_face
-from backend.services.databaseService import DATABASE_PATH
+from backend.services.databaseService import DATABASE_PATH, get_connection
 from fastapi import UploadFile, HTTPException
 from backend.services.candidateService import register_new_candidate
 from backend.services.candidateRecognitionService import recognize_candidate_face
+from backend.services.faceDetectorService import decode_image
+from backend.services.workerPoolService import run_in_pool
 
 # ✅ Setup Logging
 logging.basicConfig(
@@ -26,8 +28,7 @@ logging.getLogger().addHandler(console_handler)
 async def process_image(file: UploadFile):
     try:
         image_bytes = await file.read()
-        image_np = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(image_np, cv2.IMREAD_COLOR)
+        image = decode_image(image_bytes)
 
         if image is None:
             logging.error("❌ Error: Uploaded file is invalid.")
@@ -42,8 +43,7 @@ async def process_image(file: UploadFile):
 def process_base64_image(image_base64: str):
     try:
         image_bytes = base64.b64decode(image_base64)
-        np_arr = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+        image = decode_image(image_bytes)
 
         if image is None:
             raise ValueError("Invalid base64 image.")
@@ -68,14 +68,11 @@ def recognize_candidate_from_base64(image_base64: str):
 # ✅ Store Candidate Recognition Logs in `voters.db`
 def log_candidate_recognition(recognized_user):
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO candidate_recognition_logs (universityID, recognized_name, confidence) VALUES (?, ?, ?)",
-            (recognized_user["universityID"], recognized_user["name"], recognized_user["confidence"])
-        )
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:  # Rolls back a failed insert instead of leaving the shared connection mid-transaction
+            conn.execute(
+                "INSERT INTO candidate_recognition_logs (universityID, recognized_name, confidence) VALUES (?, ?, ?)",
+                (recognized_user["universityID"], recognized_user["name"], recognized_user["confidence"])
+            )
         logging.info(f"✅ Candidate Recognition logged: {recognized_user['name']} ({recognized_user['universityID']})")
     except Exception as e:
         logging.error(f"❌ Error logging candidate recognition: {str(e)}")
@@ -89,7 +86,7 @@ async def recognize_candidate(file: UploadFile):
         logging.warning("⚠️ Uploaded image is invalid.")
         return {"status": "error", "message": "Invalid image file"}
 
-    recognition_result = recognize_candidate_face(image)
+    recognition_result = await run_in_pool(recognize_candidate_face, image)
 
     if recognition_result.get("status") == "success":
         log_candidate_recognition(recognition_result["recognized_user"])
@@ -106,7 +103,7 @@ async def perform_candidate_liveness_check(file: UploadFile):
     if image is None:
         return {"status": "error", "message": "Invalid image file"}
 
-    liveness_result = is_live_face(image)
+    liveness_result = await run_in_pool(is_live_face, image)
 
     if liveness_result.get("status") == "success":
         return liveness_result
@@ -124,7 +121,7 @@ async def recognize_candidate_live(file: UploadFile):
     if image is None:
         return {"status": "error", "message": "Invalid image file"}
 
-    recognition_result = recognize_candidate_face(image)
+    recognition_result = await run_in_pool(recognize_candidate_face, image)
 
     if recognition_result["status"] == "success":
         log_candidate_recognition(recognition_result["recognized_user"])
@@ -5,10 +5,12 @@ import base64
 import time
 import sqlite3
 from backend.services.livenessService import is_live_face
-from backend.services.databaseService import DATABASE_PATH
+from backend.services.databaseService import DATABASE_PATH, get_connection
 from fastapi import UploadFile, HTTPException
 from backend.services.voterService import register_new_voter
 from backend.services.faceRecognitionService import recognize_face
+from backend.services.faceDetectorService import decode_image
+from backend.services.workerPoolService import run_in_pool
 
 
 
@@ -23,8 +25,7 @@ logging.basicConfig(
 async def process_image(file: UploadFile):
     try:
         image_bytes = await file.read()
-        image_np = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(image_np, cv2.IMREAD_COLOR)
+        image = decode_image(image_bytes)
 
         if image is None:
             logging.error("❌ Error: Uploaded file is invalid.")
@@ -39,8 +40,7 @@ async def process_image(file: UploadFile):
 def process_base64_image(image_base64: str):
     try:
         image_bytes = base64.b64decode(image_base64)
-        np_arr = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+        image = decode_image(image_bytes)
 
         if image is None:
             raise ValueError("Invalid base64 image.")
@@ -102,7 +102,7 @@ async def recognize_live_face(file: UploadFile):
 
     # ✅ Process Image & Recognize Face
     image = await process_image(file)
-    recognition_result = await recognize_face(image)
+    recognition_result = await run_in_pool(recognize_face, image)
 
     if recognition_result["status"] == "success":
         log_recognition(recognition_result["recognized_user"])
@@ -125,14 +125,11 @@ def recognize_face_from_base64(image_base64: str):
 # ✅ Store Recognition Logs in `voters.db`
 def log_recognition(recognized_user):
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO recognition_logs (universityID, recognized_name, confidence) VALUES (?, ?, ?)",
-            (recognized_user["universityID"], recognized_user["name"], recognized_user["confidence"])
-        )
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:  # Rolls back a failed insert instead of leaving the shared connection mid-transaction
+            conn.execute(
+                "INSERT INTO recognition_logs (universityID, recognized_name, confidence) VALUES (?, ?, ?)",
+                (recognized_user["universityID"], recognized_user["name"], recognized_user["confidence"])
+            )
         logging.info(f"✅ Recognition logged: {recognized_user['name']} ({recognized_user['universityID']})")
     except Exception as e:
         logging.error(f"❌ Error logging recognition: {str(e)}")
@@ -145,7 +142,7 @@ async def recognize_user(file: UploadFile):
         logging.warning("⚠️ Uploaded image is invalid.")
         return {"status": "error", "message": "Invalid image file"}
 
-    recognition_result = recognize_face(image)
+    recognition_result = await run_in_pool(recognize_face, image)
 
     if recognition_result.get("status") == "success":
         log_recognition(recognition_result["recognized_user"])
@@ -161,7 +158,7 @@ async def perform_liveness_check(file: UploadFile):
     if image is None:
         return {"status": "error", "message": "Invalid image file"}
 
-    liveness_result = is_live_face(image)
+    liveness_result = await run_in_pool(is_live_face, image)
 
     if liveness_result.get("status") == "success":
         return liveness_result
@@ -1,6 +1,6 @@
 import backend.services.faceRecognitionService as face_service
-from backend.services.voterService import check_has_voted, update_voting_status
-from backend.services.voteService import record_vote, get_results
+from backend.services.voteService import record_vote_once, get_results, VOTE_RECORDED, VOTE_ALREADY_CAST
+from backend.services.faceDetectorService import decode_image
 
 import base64
 from fastapi import UploadFile
@@ -20,27 +20,23 @@ def verify_and_cast_vote(file: UploadFile, selected_candidate: str, universityID
     :param universityID: Voter's University ID.
     :return: Vote status or error message.
     """
-    # ✅ Convert image to Base64
-    image_base64 = process_image(file)
+    # ✅ Decode uploaded image
+    image = decode_image(file.file.read())
+    if image is None:
+        return {"status": "error", "message": "Invalid image format."}
 
-    # ✅ Face recognition
-    recognition_result = face_service.recognize_face_base64(image_base64)
+    # ✅ 1:1 face verification against the claimed voter
+    verification_result = face_service.verify_face(image, universityID)
 
+    if verification_result["status"] == "error":
+        return {"status": "error", "message": verification_result["message"]}
 
-    if recognition_result["status"] == "error":
-        return {"status": "error", "message": recognition_result["message"]}
-
-    recognized_user = recognition_result.get("recognized_user")
-    if not recognized_user or recognized_user != universityID:
-        return {"status": "error", "message": "Face does not match the voter."}
-
-    # ✅ Check if voter has already voted
-    if check_has_voted(universityID):
+    # ✅ Record vote and mark the voter in one transaction (rejects a second vote atomically)
+    outcome = record_vote_once(universityID, selected_candidate)
+    if outcome == VOTE_ALREADY_CAST:
         return {"status": "error", "message": "User has already voted."}
-
-    # ✅ Record vote
-    record_vote(universityID, selected_candidate)
-    update_voting_status(universityID, True)
+    if outcome != VOTE_RECORDED:
+        return {"status": "error", "message": "Voter does not exist in the database."}
 
     return {"status": "success", "message": "Vote successfully cast!"}
 
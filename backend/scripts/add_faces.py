@@ -3,24 +3,43 @@ import cv2
 import os
 import dlib
 import numpy as np
-import pickle
 import argparse
 import logging
+import json
+import shutil
+from multiprocessing import Pool
 from tqdm import tqdm
 import subprocess
 import sys
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from backend.services.faceDetectorService import detect_faces, read_image
+from backend.services.faceDatasetService import save_dataset
+from backend.services.embeddingCacheService import embed_image_bytes
+from backend.services.enrollmentStageService import run_enrollment_stage, image_hash, chip_path
+from backend.services.databaseService import migrate_inline_images
+from backend.services.voteWriterService import initialize_tallies
+from backend.utils import profiler
+from backend.utils.profiler import profile_stage
+
 # ✅ Paths
 DATASET_PATH = "backend/dataset/LFW/lfw-deepfunneled"  # LFW Dataset
 DATABASE = "backend/data/voters.db"  # SQLite Voter & Candidate DB
-SAVE_PATH = "backend/data"  # Path to Save `.pkl` files
+SAVE_PATH = "backend/data"  # Path to Save the face datasets (`.npy` + `.labels.json`)
 LOG_FILE = "backend/logs/face_processing.log"
+PROFILE_REPORT_PATH = "backend/data/add_faces_profile.json"
 
 # ✅ Directories for Extracted Images
 VOTERS_DIR = "backend/data/voters/"
 CANDIDATES_DIR = "backend/data/candidates/"
 LFW_DIR = "backend/data/lfw/"
 
+# ✅ Resumable LFW Ingestion (checkpoint manifest + append-only crop features)
+LFW_MANIFEST_PATH = os.path.join(SAVE_PATH, "lfw_manifest.jsonl")
+LFW_FEATURES_PATH = os.path.join(SAVE_PATH, "lfw_faces.u8")
+FACE_CROP_SIZE = (50, 50)
+FEATURE_BYTES = FACE_CROP_SIZE[0] * FACE_CROP_SIZE[1]
+
 # ✅ Ensure necessary directories exist
 os.makedirs(VOTERS_DIR, exist_ok=True)
 os.makedirs(CANDIDATES_DIR, exist_ok=True)
@@ -40,127 +59,226 @@ logging.getLogger().addHandler(console_handler)
 
 logging.info("✅ Face Processing Script Started.")
 
-# ✅ Load Dlib's Face Detector
-detector = dlib.get_frontal_face_detector()
-
-# ✅ Storage Lists
-lfw_faces, lfw_names = [], []
-voter_faces, voter_names = [], []
-candidate_faces, candidate_names = [], []
-skipped_files = []
+# ✅ Crop, Resize & Flatten Every Detected Face
+def extract_face_crops(image):
+    """Returns ([(grayscale crop, flattened 50x50 features), ...], skip reason or None)."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    with profile_stage("lfw_detect", 1):
+        faces = detect_faces(image, site="training")
+    if len(faces) == 0:
+        return [], "No face detected"
 
-# ✅ Argument Parser
-parser = argparse.ArgumentParser()
-parser.add_argument("--only-voters", action="store_true", help="Process only voter database faces.")
-parser.add_argument("--only-candidates", action="store_true", help="Process only candidate database faces.")
-args = parser.parse_args()
-
-# 🔹 1️⃣ Process LFW Dataset (Unless `--only-voters` or `--only-candidates` is set)
-if not args.only_voters and not args.only_candidates:
-    logging.info("🔍 Processing images from LFW dataset...")
-    for person_name in tqdm(os.listdir(DATASET_PATH)):
-        person_folder = os.path.join(DATASET_PATH, person_name)
-        if not os.path.isdir(person_folder):
+    crops = []
+    for face in faces:
+        x, y, w, h = face.left(), face.top(), face.width(), face.height()
+        face_img = gray[y:y+h, x:x+w]
+        if face_img.size == 0:
             continue
-        for image_name in os.listdir(person_folder):
-            image_path = os.path.join(DATASET_PATH, person_name, image_name)
-            image = cv2.imread(image_path)
-            if image is None:
-                skipped_files.append((image_path, "Corrupted image"))
-                continue
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            faces = detector(gray)
-            if len(faces) == 0:
-                skipped_files.append((image_path, "No face detected"))
-                continue
-            for face in faces:
-                x, y, w, h = face.left(), face.top(), face.width(), face.height()
-                face_img = gray[y:y+h, x:x+w]
-                if face_img.size == 0:
-                    skipped_files.append((image_path, "Empty cropped face"))
-                    continue
-                face_img = cv2.resize(face_img, (50, 50)).flatten()
-                lfw_faces.append(face_img)
-                lfw_names.append(person_name)
-
-                # ✅ Save extracted image
-                save_path = os.path.join(LFW_DIR, f"{person_name}_{image_name}")
-                cv2.imwrite(save_path, gray[y:y+h, x:x+w])
-
-# 🔹 2️⃣ Process Database Images (Voters & Candidates)
-def process_database_faces(table_name, faces_list, names_list, output_dir):
-    """Extracts and processes face images from SQLite database."""
-    logging.info(f"🔹 Processing {table_name} images from database...")
-
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    cursor.execute(f"SELECT universityID, firstname, lastname, image FROM {table_name} WHERE image IS NOT NULL")
-    user_data = cursor.fetchall()
-    conn.close()
+        crops.append((face_img, cv2.resize(face_img, FACE_CROP_SIZE).flatten()))
+    return crops, None if crops else "Empty cropped face"
 
-    for universityID, firstname, lastname, face_image in user_data:
+# 🔹 1️⃣ Process LFW Dataset (runs in worker processes when --workers > 1)
+def process_lfw_chunk(chunk):
+    """Processes a chunk of (image_path, person_name, image_name) and writes the cropped JPEGs."""
+    results = []
+    for image_path, person_name, image_name in chunk:
         try:
-            image_array = np.frombuffer(face_image, np.uint8)
-            image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
+            with profile_stage("lfw_decode", 1):
+                image = read_image(image_path)
             if image is None:
-                skipped_files.append((universityID, "Invalid image format"))
+                results.append((image_path, person_name, "Corrupted image", b""))
                 continue
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            faces = detector(gray)
-            if len(faces) == 0:
-                skipped_files.append((universityID, "No face detected"))
-                continue
-            for face in faces:
-                x, y, w, h = face.left(), face.top(), face.width(), face.height()
-                face_img = gray[y:y+h, x:x+w]
-                if face_img.size == 0:
-                    skipped_files.append((universityID, "Empty cropped face"))
-                    continue
-                face_img = cv2.resize(face_img, (50, 50)).flatten()
-                faces_list.append(face_img)
-                names_list.append(f"{firstname} {lastname} ({universityID})")
-
-                # ✅ Save extracted image
-                save_path = os.path.join(output_dir, f"{universityID}.jpg")
-                cv2.imwrite(save_path, gray[y:y+h, x:x+w])
 
+            crops, reason = extract_face_crops(image)
+            with profile_stage("lfw_write_crops", len(crops)):
+                for face_img, _ in crops:
+                    cv2.imwrite(os.path.join(LFW_DIR, f"{person_name}_{image_name}"), face_img)
+            features = b"".join(feature.astype(np.uint8).tobytes() for _, feature in crops)
+            results.append((image_path, person_name, reason or "ok", features))
         except Exception as e:
-            skipped_files.append((universityID, f"Processing error: {str(e)}"))
+            results.append((image_path, person_name, f"Processing error: {str(e)}", b""))
+    return results
+
+def load_lfw_manifest():
+    """
+    Reads the checkpoint manifest: (processed paths, face rows written, [(name, faces), ...], skipped,
+    byte offset just past the last complete line).
+    """
+    done, entries, skipped, rows, valid_bytes = set(), [], [], 0, 0
+    if os.path.exists(LFW_MANIFEST_PATH):
+        with open(LFW_MANIFEST_PATH, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Torn last line from an interrupted run
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                done.add(entry["path"])
+                entries.append((entry["name"], entry["faces"]))
+                rows += entry["faces"]
+                if entry["status"] != "ok":
+                    skipped.append((entry["path"], entry["status"]))
+                valid_bytes += len(line)
+    return done, rows, entries, skipped, valid_bytes
+
+def ingest_lfw(workers=1, chunk_size=64, restart=False):
+    """Streams LFW crops to disk chunk by chunk; a rerun skips every file already in the manifest."""
+    if restart:
+        for path in (LFW_MANIFEST_PATH, LFW_FEATURES_PATH):
+            if os.path.exists(path):
+                os.remove(path)
+
+    done, rows, _, _, valid_bytes = load_lfw_manifest()
+
+    # ✅ Drop a torn manifest line, so new records are not appended onto it
+    if os.path.exists(LFW_MANIFEST_PATH) and os.path.getsize(LFW_MANIFEST_PATH) != valid_bytes:
+        with open(LFW_MANIFEST_PATH, "r+b") as f:
+            f.truncate(valid_bytes)
 
-# ✅ Process Voters
-if not args.only_candidates:
-    process_database_faces("voters", voter_faces, voter_names, VOTERS_DIR)
+    # ✅ Drop feature rows written after the last manifest checkpoint
+    if os.path.exists(LFW_FEATURES_PATH) and os.path.getsize(LFW_FEATURES_PATH) != rows * FEATURE_BYTES:
+        with open(LFW_FEATURES_PATH, "r+b") as f:
+            f.truncate(rows * FEATURE_BYTES)
 
-# ✅ Process Candidates
-if not args.only_voters:
-    process_database_faces("candidates", candidate_faces, candidate_names, CANDIDATES_DIR)
+    tasks = [
+        (os.path.join(DATASET_PATH, person_name, image_name), person_name, image_name)
+        for person_name in sorted(os.listdir(DATASET_PATH))
+        if os.path.isdir(os.path.join(DATASET_PATH, person_name))
+        for image_name in sorted(os.listdir(os.path.join(DATASET_PATH, person_name)))
+    ]
+    tasks = [task for task in tasks if task[0] not in done]
+    chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+    logging.info(f"🔍 LFW: {len(done)} images already processed, {len(tasks)} to go in {len(chunks)} chunks ({workers} worker(s)).")
+
+    pool = Pool(workers) if workers > 1 and chunks else None
+    try:
+        results = pool.imap_unordered(process_lfw_chunk, chunks) if pool else map(process_lfw_chunk, chunks)
+        # Per-image stages are timed in-process only (--workers 1); with a pool this covers the whole run
+        with profile_stage("lfw_ingest", len(tasks)), \
+                open(LFW_FEATURES_PATH, "ab") as features_file, open(LFW_MANIFEST_PATH, "a") as manifest_file:
+            for chunk_results in tqdm(results, total=len(chunks)):
+                for image_path, person_name, status, features in chunk_results:
+                    features_file.write(features)
+                    manifest_file.write(json.dumps({
+                        "path": image_path, "name": person_name, "status": status,
+                        "faces": len(features) // FEATURE_BYTES,
+                    }) + "\n")
+                # ✅ Checkpoint: features first, then the manifest lines that account for them
+                features_file.flush()
+                manifest_file.flush()
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    _, rows, entries, skipped, _ = load_lfw_manifest()
+    skipped_files.extend(skipped)
+    names = [name for name, faces in entries for _ in range(faces)]
+    faces = np.memmap(LFW_FEATURES_PATH, dtype=np.uint8, mode="r", shape=(rows, FEATURE_BYTES)) if rows else np.empty((0, FEATURE_BYTES), dtype=np.uint8)
+    return faces, names
+
+# 🔹 2️⃣ Process Database Images (Voters & Candidates) Through the Shared Enrollment Stage
+def process_database_faces(table_name, output_dir):
+    """
+    Runs every stored photo through the enrollment stage (aligned chip + embedding, reused from the
+    embedding cache when already done) and exports the chips as `<universityID>.jpg`.
+    train_knn.py reads the same cached embeddings, so no face is detected twice.
+    """
+    logging.info(f"🔹 Processing {table_name} images from database...")
+
+    with profile_stage("fetch") as stage:
+        conn = sqlite3.connect(DATABASE)
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT t.universityID, face_images.image FROM {table_name} AS t
+            JOIN face_images ON face_images.hash = t.image_hash
+        """)
+        user_data = cursor.fetchall()
+        conn.close()
+        stage["items"] = len(user_data)
+
+    blobs = [face_image for _, face_image in user_data]
+    embeddings = embed_image_bytes(blobs)
+
+    # ✅ Embeddings cached before chips were kept: run the stage again to produce the chip
+    missing = [i for i, embedding in enumerate(embeddings)
+               if embedding is not None and not os.path.exists(chip_path(image_hash(blobs[i])))]
+    if missing:
+        run_enrollment_stage([blobs[i] for i in missing])
+
+    exported = 0
+    with profile_stage("export_chips") as stage:
+        for (universityID, face_image), embedding in zip(user_data, embeddings):
+            if embedding is None:
+                skipped_files.append((universityID, "No usable face"))
+                continue
+            shutil.copyfile(chip_path(image_hash(face_image)), os.path.join(output_dir, f"{universityID}.jpg"))
+            exported += 1
+        stage["items"] = exported
+    return exported
 
 # ✅ Save Processed Data
-def save_data(data_list, file_name):
-    """Saves processed data as a pickle file."""
-    if data_list:
-        with open(os.path.join(SAVE_PATH, file_name), "wb") as f:
-            pickle.dump(data_list, f)
-
-save_data(voter_faces, "voter_faces.pkl")
-save_data(voter_names, "voter_names.pkl")
-save_data(candidate_faces, "candidate_faces.pkl")
-save_data(candidate_names, "candidate_names.pkl")
-
-if not args.only_voters and not args.only_candidates:
-    save_data(lfw_faces, "lfw_faces.pkl")
-    save_data(lfw_names, "lfw_names.pkl")
-
-# ✅ Summary Report
-logging.info("✅ Face data processing complete!")
-logging.info(f"✔️ Voter Faces: {len(voter_faces)}")
-logging.info(f"✔️ Candidate Faces: {len(candidate_faces)}")
-if not args.only_voters and not args.only_candidates:
-    logging.info(f"✔️ LFW Faces: {len(lfw_faces)}")
-logging.info(f"⚠️ Skipped Images: {len(skipped_files)}")
-if skipped_files:
-    with open(os.path.join(SAVE_PATH, "skipped_files.log"), "w") as f:
-        for item in skipped_files:
-            f.write(f"{item}\n")
-
-logging.info("✅ Image processing completed successfully!")
+def save_data(faces, names, name):
+    """Saves processed faces as a memory-mappable uint8 dataset (`<name>.npy` + `<name>.labels.json`)."""
+    if len(names):
+        save_dataset(os.path.join(SAVE_PATH, name), faces, names, dtype=np.uint8)
+
+# ✅ Storage Lists
+skipped_files = []
+
+def main():
+    # ✅ Argument Parser
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only-voters", action="store_true", help="Process only voter database faces.")
+    parser.add_argument("--only-candidates", action="store_true", help="Process only candidate database faces.")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for LFW ingestion.")
+    parser.add_argument("--chunk-size", type=int, default=64, help="LFW images handed to a worker at a time.")
+    parser.add_argument("--restart", action="store_true", help="Ignore the LFW checkpoint and start over.")
+    parser.add_argument("--profile", action="store_true", help=f"Write per-stage timings and peak RSS to {PROFILE_REPORT_PATH}.")
+    args = parser.parse_args()
+    run_profiler = profiler.activate("add_faces") if args.profile else None
+    with_lfw = not args.only_voters and not args.only_candidates
+
+    # ✅ Upgrade `voters.db` First (photos are read through `face_images`)
+    migrate_inline_images("voters")
+    migrate_inline_images("candidates")
+    initialize_tallies()
+
+    # 🔹 LFW (unless `--only-voters` or `--only-candidates` is set)
+    lfw_faces, lfw_names = [], []
+    if with_lfw:
+        logging.info("🔍 Processing images from LFW dataset...")
+        lfw_faces, lfw_names = ingest_lfw(args.workers, args.chunk_size, args.restart)
+
+    # ✅ Process Voters
+    voter_count = process_database_faces("voters", VOTERS_DIR) if not args.only_candidates else 0
+
+    # ✅ Process Candidates
+    candidate_count = process_database_faces("candidates", CANDIDATES_DIR) if not args.only_voters else 0
+
+    if with_lfw:
+        # Copied straight from the memory-mapped checkpoint, never materialized as Python objects
+        with profile_stage("save_lfw_dataset", len(lfw_names)):
+            save_data(lfw_faces, lfw_names, "lfw_faces")
+
+    # ✅ Summary Report
+    logging.info("✅ Face data processing complete!")
+    logging.info(f"✔️ Voter Faces: {voter_count}")
+    logging.info(f"✔️ Candidate Faces: {candidate_count}")
+    if with_lfw:
+        logging.info(f"✔️ LFW Faces: {len(lfw_faces)}")
+    logging.info(f"⚠️ Skipped Images: {len(skipped_files)}")
+    if skipped_files:
+        with open(os.path.join(SAVE_PATH, "skipped_files.log"), "w") as f:
+            for item in skipped_files:
+                f.write(f"{item}\n")
+
+    logging.info("✅ Image processing completed successfully!")
+
+    # ✅ Per-Stage Timing Report
+    if run_profiler:
+        run_profiler.save(PROFILE_REPORT_PATH)
+
+if __name__ == "__main__":
+    main()
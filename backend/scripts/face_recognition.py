@@ -66,7 +66,10 @@ def recognize_face_from_database(image_array):
         gray_input = cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY)
         conn = sqlite3.connect(DATABASE)
         cursor = conn.cursor()
-        cursor.execute("SELECT universityID, firstname, lastname, image FROM voters")
+        cursor.execute("""
+            SELECT voters.universityID, voters.firstname, voters.lastname, face_images.image FROM voters
+            JOIN face_images ON face_images.hash = voters.image_hash
+        """)
         stored_faces = cursor.fetchall()
         conn.close()
 
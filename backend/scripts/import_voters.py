@@ -0,0 +1,47 @@
+import os
+import sys
+import json
+import argparse
+import logging
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from backend.services.bulkImportService import import_voters, BULK_IMPORT_WORKERS
+
+# 📌 Paths
+LOG_FILE = "backend/logs/import_voters.log"
+REPORT_PATH = "backend/data/import_failures.json"
+
+# ✅ Ensure Directories Exist
+os.makedirs("backend/logs", exist_ok=True)
+
+# ✅ Setup Logging
+logging.basicConfig(
+    filename=LOG_FILE, level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s"
+)
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.INFO)
+console_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+logging.getLogger().addHandler(console_handler)
+
+
+def main():
+    # ✅ Argument Parser
+    parser = argparse.ArgumentParser(description="Bulk-register voters from a roster and a photo folder or .zip archive.")
+    parser.add_argument("roster", help="CSV (with header) or JSONL roster: universityID, firstname, lastname, email, password[, image].")
+    parser.add_argument("images", help="Directory or .zip archive holding the photos (default name: <universityID>.jpg).")
+    parser.add_argument("--workers", type=int, default=BULK_IMPORT_WORKERS, help="Worker processes for embedding / threads for hashing.")
+    args = parser.parse_args()
+
+    logging.info(f"✅ Voter Import Started: {args.roster} + {args.images}")
+    summary = import_voters(args.roster, args.images, workers=args.workers)
+
+    # ✅ Per-Row Failure Report
+    with open(REPORT_PATH, "w") as f:
+        json.dump(summary["failures"], f, indent=2)
+    logging.info(f"✔️ Imported: {summary['imported']}")
+    logging.info(f"⚠️ Failed: {summary['failed']} (details in {REPORT_PATH})")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,7 @@ DATABASE = "backend/data/voters.db"
 conn = sqlite3.connect(DATABASE)
 cursor = conn.cursor()
 
-cursor.execute("SELECT image FROM voters WHERE universityID = '2'")
+cursor.execute("SELECT face_images.image FROM voters JOIN face_images ON face_images.hash = voters.image_hash WHERE voters.universityID = '2'")
 result = cursor.fetchone()
 conn.close()
 
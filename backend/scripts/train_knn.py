@@ -1,45 +1,39 @@
-import pickle
 import numpy as np
 import argparse
 import sqlite3
 import os
 import logging
-import cv2
-import dlib
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.preprocessing import StandardScaler
-import subprocess
 import sys
 
-# ✅ Load Dlib Models
-FACE_REC_MODEL_PATH = "backend/models/dlib_face_recognition_resnet_model_v1.dat"
-PREDICTOR_PATH = "backend/models/shape_predictor_68_face_landmarks.dat"
-CNN_MODEL_PATH = "backend/models/mmod_human_face_detector.dat"
-
-cnn_detector = dlib.cnn_face_detection_model_v1(CNN_MODEL_PATH)
-face_recognizer = dlib.face_recognition_model_v1(FACE_REC_MODEL_PATH)
-landmark_predictor = dlib.shape_predictor(PREDICTOR_PATH)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from backend.services.faceGalleryService import FaceGallery, VOTER_GALLERY_PATH, EMBEDDING_DIM
+from backend.services.faceIndexService import create_index
+from backend.services.faceDatasetService import save_dataset, load_dataset
+from backend.services.embeddingCacheService import embed_image_bytes
+from backend.services.faceMatcherService import parse_label
+from backend.utils.helpers import save_pickle_atomic
+from backend.services.databaseService import migrate_inline_images
+from backend.services.voteWriterService import initialize_tallies
+from backend.utils import profiler
+from backend.utils.profiler import profile_stage
 
 # 📌 Paths
 DATABASE_PATH = "backend/data/voters.db"
-VOTER_FACES_PATH = "backend/data/voter_faces.pkl"
-VOTER_NAMES_PATH = "backend/data/voter_names.pkl"
-CANDIDATE_FACES_PATH = "backend/data/candidate_faces.pkl"
-CANDIDATE_NAMES_PATH = "backend/data/candidate_names.pkl"
-LFW_FACES_PATH = "backend/data/lfw_faces.pkl"
-LFW_NAMES_PATH = "backend/data/lfw_names.pkl"
-
-KNN_VOTER_MODEL_PATH = "backend/data/knn_voter.pkl"
-KNN_CANDIDATE_MODEL_PATH = "backend/data/knn_candidate.pkl"
-KNN_LFW_MODEL_PATH = "backend/data/knn_lfw.pkl"
+VOTER_DATASET_PATH = "backend/data/voter_embeddings"     # .npy + .labels.json
+VOTER_INDEX_PATH = "backend/data/voter_index.npz"
+CANDIDATE_DATASET_PATH = "backend/data/candidate_embeddings"
+CANDIDATE_GALLERY_PATH = "backend/data/candidate_gallery.npz"
+LFW_FACES_DATASET_PATH = "backend/data/lfw_faces"
 
-SCALER_VOTER_PATH = "backend/data/scaler_voter.pkl"
-SCALER_CANDIDATE_PATH = "backend/data/scaler_candidate.pkl"
+KNN_LFW_MODEL_PATH = "backend/data/knn_lfw.pkl"
 SCALER_LFW_PATH = "backend/data/scaler_lfw.pkl"
 
 LFW_DATASET_PATH = "backend/dataset/LFW/lfw-deepfunneled"
 
 LOG_FILE = "backend/logs/train_knn.log"
+PROFILE_REPORT_PATH = "backend/data/train_knn_profile.json"
 
 # ✅ Ensure Directories Exist
 os.makedirs("backend/logs", exist_ok=True)
@@ -59,67 +53,57 @@ logging.info("✅ KNN Training Script Started.")
 
 # ✅ Argument Parser
 parser = argparse.ArgumentParser()
-parser.add_argument("--only-voters", action="store_true", help="Train only voter KNN model.")
-parser.add_argument("--only-candidates", action="store_true", help="Train only candidate KNN model.")
+parser.add_argument("--only-voters", action="store_true", help="Rebuild only the voter embedding gallery.")
+parser.add_argument("--only-candidates", action="store_true", help="Rebuild only the candidate embedding gallery.")
 parser.add_argument("--only-lfw", action="store_true", help="Train only LFW KNN model.")
+parser.add_argument("--profile", action="store_true", help=f"Write per-stage timings and peak RSS to {PROFILE_REPORT_PATH}.")
 args = parser.parse_args()
 
-# ✅ Function to preprocess images (Flattened for Voters & LFW)
-def preprocess_face(image):
-    """Resize, grayscale, normalize, and flatten image."""
-    image = cv2.resize(image, (100, 100))  # Resize
-    if len(image.shape) == 3:
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)  # Convert to grayscale
-    image = cv2.equalizeHist(image)  # Histogram Equalization
-    image = image.astype("float32") / 255.0  # Normalize pixel values (0-1)
-    return image.flatten()  # ✅ Use Flattened 100x100=10000 features
-
-# ✅ Extract faces from `voters.db`
-def extract_faces_from_db(table_name, faces_path, names_path, use_embeddings=False):
-    """Extracts face images from a given table in the SQLite database and saves as .pkl."""
+run_profiler = profiler.activate("train_knn") if args.profile else None
+
+# ✅ Extract 128-D embeddings from `voters.db` (voters & candidates share this pipeline)
+def extract_faces_from_db(table_name, dataset_path, gallery_path, index_path=None):
+    """Embeds every face image in a table, saves the embedding dataset and publishes a new gallery."""
     logging.info(f"🔹 Extracting {table_name} faces from database...")
 
     faces = []
     names = []
 
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT universityID, firstname, lastname, image FROM {table_name} WHERE image IS NOT NULL")
-        data = cursor.fetchall()
-        conn.close()
-
-        for universityID, firstname, lastname, face_image in data:
-            image_array = np.frombuffer(face_image, np.uint8)
-            image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-            if image is None:
-                logging.warning(f"⚠️ Skipped {table_name} record {universityID}: Invalid image format")
+        with profile_stage("fetch") as stage:
+            conn = sqlite3.connect(DATABASE_PATH)
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT t.universityID, t.firstname, t.lastname, face_images.image FROM {table_name} AS t
+                JOIN face_images ON face_images.hash = t.image_hash
+            """)
+            data = cursor.fetchall()
+            conn.close()
+            stage["items"] = len(data)
+
+        # ✅ Retrains reuse every embedding already in the content-hash cache
+        embeddings = embed_image_bytes([face_image for _, _, _, face_image in data])
+        for (universityID, firstname, lastname, _), face_embedding in zip(data, embeddings):
+            if face_embedding is None:
+                logging.warning(f"⚠️ No usable face for {universityID}. Skipping...")
                 continue
 
-            if use_embeddings:
-                # ✅ Candidate uses 128-D embeddings
-                rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                faces_detected = cnn_detector(rgb_image)
-                if len(faces_detected) == 0:
-                    logging.warning(f"⚠️ No face detected for {universityID}. Skipping...")
-                    continue
-
-                face_rect = faces_detected[0].rect
-                shape = landmark_predictor(rgb_image, face_rect)
-                face_embedding = np.array(face_recognizer.compute_face_descriptor(rgb_image, shape))
-                faces.append(face_embedding)
-            else:
-                # ✅ Voters & LFW use flattened images
-                processed_face = preprocess_face(image)
-                faces.append(processed_face)
-
+            faces.append(face_embedding)
             names.append(f"{firstname} {lastname} ({universityID})")
 
-        # ✅ Save extracted data
-        with open(faces_path, "wb") as f:
-            pickle.dump(faces, f)
-        with open(names_path, "wb") as f:
-            pickle.dump(names, f)
+        # ✅ Save extracted data (atomically, so a running API never reads a partial file)
+        with profile_stage("save_dataset", len(faces)):
+            save_dataset(dataset_path, faces, names)
+
+        # ✅ Publish a new gallery version; the API's gallery watcher swaps it in live
+        ids, plain_names = zip(*(parse_label(label) for label in names)) if names else ((), ())
+        gallery = FaceGallery(ids, plain_names, np.array(faces, dtype=np.float32).reshape(-1, EMBEDDING_DIM))
+        if index_path:
+            # Rows may have moved, so retrain the index before the gallery that it describes goes live
+            with profile_stage("build_index", len(gallery)):
+                create_index(gallery, index_path, rebuild=True)
+        with profile_stage("save_gallery", len(gallery)):
+            gallery.save(gallery_path, version=gallery.version)  # The version the index was stamped with
 
         logging.info(f"✅ Extracted and saved {len(faces)} {table_name} faces.")
 
@@ -127,16 +111,15 @@ def extract_faces_from_db(table_name, faces_path, names_path, use_embeddings=Fal
         logging.error(f"❌ Database error while extracting {table_name}: {str(e)}")
 
 # ✅ Train KNN Model
-def train_knn(faces_path, names_path, model_path, scaler_path, dataset_name, use_flattened):
+def train_knn(dataset_path, model_path, scaler_path, dataset_name):
     """Train KNN model on extracted face data."""
-    if not os.path.exists(faces_path) or not os.path.exists(names_path):
+    with profile_stage("load_dataset"):
+        dataset = load_dataset(dataset_path)
+    if dataset is None:
         logging.warning(f"⚠️ No dataset found for {dataset_name}. Skipping training.")
         return
 
-    with open(faces_path, "rb") as f:
-        faces = pickle.load(f)
-    with open(names_path, "rb") as f:
-        names = pickle.load(f)
+    faces, names = dataset.features, dataset.labels
 
     if len(faces) == 0 or len(names) == 0:
         logging.warning(f"⚠️ No data to train the {dataset_name} model. Skipping training.")
@@ -145,36 +128,44 @@ def train_knn(faces_path, names_path, model_path, scaler_path, dataset_name, use
     if len(faces) < 5:
         logging.warning(f"⚠️ The {dataset_name} dataset has fewer than 5 samples. KNN may not perform well.")
 
-    faces = np.array(faces, dtype=np.float32)
+    faces = np.asarray(faces, dtype=np.float32)  # No copy for float32 datasets (memory-mapped)
 
     # ✅ Standardize Features
-    scaler = StandardScaler()
-    faces = scaler.fit_transform(faces)
-    with open(SCALER_CANDIDATE_PATH, "wb") as f :
-        pickle.dump(scaler, f)
+    with profile_stage("scale", len(faces)):
+        scaler = StandardScaler()
+        faces = scaler.fit_transform(faces)
 
     # ✅ Train KNN Model
-    n_neighbors = min(3, len(faces))  # Safeguard for small datasets
-    knn = KNeighborsClassifier(n_neighbors=n_neighbors, algorithm="auto", weights="distance")
-    knn.fit(faces, names)
+    with profile_stage("knn_fit", len(faces)):
+        n_neighbors = min(3, len(faces))  # Safeguard for small datasets
+        knn = KNeighborsClassifier(n_neighbors=n_neighbors, algorithm="auto", weights="distance")
+        knn.fit(faces, names)
 
     # ✅ Save Model & Scaler
-    with open(model_path, "wb") as f:
-        pickle.dump(knn, f)
-    with open(scaler_path, "wb") as f:
-        pickle.dump(scaler, f)
+    with profile_stage("save_model"):
+        save_pickle_atomic(knn, model_path)
+        save_pickle_atomic(scaler, scaler_path)
 
     logging.info(f"✅ {dataset_name} KNN model trained and saved.")
 
+# ✅ Upgrade `voters.db` First (photos are read through `face_images`)
+migrate_inline_images("voters")
+migrate_inline_images("candidates")
+initialize_tallies()
+
 # ✅ Run Training Based on Arguments
 if args.only_voters:
-    extract_faces_from_db("voters", VOTER_FACES_PATH, VOTER_NAMES_PATH, use_embeddings=False)
-    train_knn(VOTER_FACES_PATH, VOTER_NAMES_PATH, KNN_VOTER_MODEL_PATH, SCALER_VOTER_PATH, "Voter DB", use_flattened=True)
+    # ✅ Voters are matched by the embedding gallery alone (no pixel-space KNN)
+    extract_faces_from_db("voters", VOTER_DATASET_PATH, VOTER_GALLERY_PATH, VOTER_INDEX_PATH)
 
 elif args.only_candidates:
-    extract_faces_from_db("candidates", CANDIDATE_FACES_PATH, CANDIDATE_NAMES_PATH, use_embeddings=True)
-    train_knn(CANDIDATE_FACES_PATH, CANDIDATE_NAMES_PATH, KNN_CANDIDATE_MODEL_PATH, SCALER_CANDIDATE_PATH, "Candidate DB", use_flattened=False)
+    # ✅ Candidates share the voters' embedding gallery pipeline (no KNN either)
+    extract_faces_from_db("candidates", CANDIDATE_DATASET_PATH, CANDIDATE_GALLERY_PATH)
 
 elif args.only_lfw:
     extract_lfw_faces()
-    train_knn(LFW_FACES_PATH, LFW_NAMES_PATH, KNN_LFW_MODEL_PATH, SCALER_LFW_PATH, "LFW Dataset", use_flattened=True)
+    train_knn(LFW_FACES_DATASET_PATH, KNN_LFW_MODEL_PATH, SCALER_LFW_PATH, "LFW Dataset")
+
+# ✅ Per-Stage Timing Report
+if run_profiler:
+    run_profiler.save(PROFILE_REPORT_PATH)
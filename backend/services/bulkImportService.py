@@ -0,0 +1,164 @@
+import os
+import csv
+import json
+import logging
+import zipfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from backend.services.voterService import initialize_database, hash_password
+from backend.services.enrollmentStageService import run_enrollment_stage
+from backend.services.embeddingCacheService import embed_image_bytes
+from backend.services.faceRecognitionService import enroll_voter_embeddings
+from backend.services.databaseService import get_connection, store_face_image
+
+# ✅ Bulk Import Limits
+BULK_IMPORT_WORKERS = int(os.getenv("UNIVOTE_BULK_IMPORT_WORKERS", str(os.cpu_count() or 1)))
+BULK_INSERT_BATCH = 500      # Rows per INSERT transaction (also bounds SQL parameter lists)
+BULK_EMBED_CHUNK = 32        # Photos detected & embedded together by one worker process
+
+ROSTER_FIELDS = ("universityID", "firstname", "lastname", "email", "password")
+
+
+# ✅ Roster (CSV with a header row, or JSONL)
+def read_roster(path):
+    """Roster rows as dicts. An optional `image` column names the photo; default `<universityID>.jpg`."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            return [json.loads(line) for line in f if line.strip()]
+        return list(csv.DictReader(f))
+
+
+# ✅ Photos (a directory or a .zip archive, matched by file name)
+class ImageSource:
+    def __init__(self, path):
+        self.path = path
+        self._archive = None
+        self._members = {}
+        if zipfile.is_zipfile(path):
+            self._archive = zipfile.ZipFile(path)
+            self._members = {os.path.basename(name): name for name in self._archive.namelist() if not name.endswith("/")}
+        elif not os.path.isdir(path):
+            raise ValueError(f"{path} is neither a directory nor a .zip archive.")
+
+    def read(self, name):
+        """Bytes of photo `name`, or None if it is not in the source."""
+        if self._archive is not None:
+            member = self._members.get(os.path.basename(name))
+            return self._archive.read(member) if member else None
+        path = os.path.join(self.path, name)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def close(self):
+        if self._archive is not None:
+            self._archive.close()
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _existing_ids(universityIDs):
+    existing = set()
+    with get_connection() as conn:
+        for chunk in _chunks(universityIDs, BULK_INSERT_BATCH):
+            rows = conn.execute(
+                f"SELECT universityID FROM voters WHERE universityID IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            existing.update(row[0] for row in rows)
+    return existing
+
+
+# ✅ Import a Whole Roster
+def import_voters(roster_path, images_path, workers=BULK_IMPORT_WORKERS):
+    """
+    Registers every valid roster row and enrolls its face, building the voter gallery once at the end.
+    Photos are embedded in chunks across `workers` processes; passwords are hashed on `workers` threads.
+    :return: summary with one entry per failed row (1-based roster line number, ID and reason).
+    """
+    initialize_database()
+    workers = max(1, workers)
+    failures = []
+
+    def fail(row_number, row, reason):
+        failures.append({"row": row_number, "universityID": row.get("universityID"), "error": reason})
+
+    # ✅ 1️⃣ Validate rows and load their photos
+    rows = read_roster(roster_path)
+    existing = _existing_ids([str(row.get("universityID") or "").strip() for row in rows])
+    source = ImageSource(images_path)
+    candidates, seen = [], set()
+    try:
+        for row_number, row in enumerate(rows, start=1):
+            missing = [field for field in ROSTER_FIELDS if not str(row.get(field) or "").strip()]
+            if missing:
+                fail(row_number, row, f"Missing field(s): {', '.join(missing)}")
+                continue
+            universityID = str(row["universityID"]).strip()
+            if universityID in existing:
+                fail(row_number, row, "Voter already registered.")
+                continue
+            if universityID in seen:
+                fail(row_number, row, "Duplicate universityID in roster.")
+                continue
+            image_data = source.read(row.get("image") or f"{universityID}.jpg")
+            if not image_data:
+                fail(row_number, row, "Photo not found.")
+                continue
+            seen.add(universityID)
+            candidates.append((row_number, dict(row, universityID=universityID), image_data))
+    finally:
+        source.close()
+
+    # ✅ 2️⃣ Detect & embed in batches across processes (photos already in the embedding cache are skipped)
+    def embed_parallel(blobs):
+        logging.info(f"🧬 Embedding {len(blobs)} roster photo(s) on {workers} worker(s)...")
+        chunks = _chunks(blobs, BULK_EMBED_CHUNK)
+        if workers > 1 and len(chunks) > 1:
+            # Spawned (not forked) so children never inherit locks held by the API's threads
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                return [embedding for chunk in pool.map(run_enrollment_stage, chunks) for embedding in chunk]
+        return [embedding for chunk in chunks for embedding in run_enrollment_stage(chunk)]
+
+    embeddings = embed_image_bytes([image_data for _, _, image_data in candidates], embed_fn=embed_parallel)
+
+    accepted = []
+    for (row_number, row, image_data), embedding in zip(candidates, embeddings):
+        if embedding is None:
+            fail(row_number, row, "No face detected in photo.")
+        else:
+            accepted.append((row_number, row, image_data, embedding))
+
+    # ✅ 3️⃣ Hash passwords in parallel (bcrypt releases the GIL)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        hashes = list(pool.map(hash_password, [row["password"] for _, row, _, _ in accepted]))
+
+    # ✅ 4️⃣ Insert in batched transactions; IDs registered meanwhile (e.g. by the API) fail per row
+    inserted = []
+    try:
+        with get_connection() as conn:
+            for start in range(0, len(accepted), BULK_INSERT_BATCH):
+                batch = zip(accepted[start:start + BULK_INSERT_BATCH], hashes[start:start + BULK_INSERT_BATCH])
+                batch_inserted = []
+                for (row_number, row, image_data, embedding), hashed in batch:
+                    cursor = conn.execute("""
+                        INSERT OR IGNORE INTO voters (universityID, firstname, lastname, email, password, hasVoted, image_hash)
+                        VALUES (?, ?, ?, ?, ?, 0, ?)
+                    """, (row["universityID"], row["firstname"], row["lastname"], row["email"], hashed, store_face_image(conn, image_data)))
+                    if cursor.rowcount:
+                        batch_inserted.append((row, embedding))
+                    else:
+                        fail(row_number, row, "Voter already registered.")
+                conn.commit()
+                inserted.extend(batch_inserted)
+    finally:
+        # ✅ 5️⃣ Build the gallery once, from every row that was committed (even if a later batch failed)
+        enroll_voter_embeddings([
+            (row["universityID"], f"{row['firstname']} {row['lastname']}", embedding) for row, embedding in inserted
+        ])
+
+    failures.sort(key=lambda failure: failure["row"])
+    logging.info(f"✅ Bulk import finished: {len(inserted)} imported, {len(failures)} failed.")
+    return {"status": "success", "imported": len(inserted), "failed": len(failures), "failures": failures}
@@ -4,18 +4,22 @@ import numpy as np
 import pickle
 import logging
 import os
+import sqlite3
+import threading
 import subprocess
-from sklearn.preprocessing import StandardScaler
-from sklearn.neighbors import KNeighborsClassifier
-from backend.services.faceRecognitionService import preprocess_face
+from backend.services.faceGalleryService import FaceGallery, gallery_watcher, reports_version
+from backend.services.faceDatasetService import load_dataset
+from backend.services.embeddingCacheService import embed_image_bytes
+from backend.services.faceMatcherService import FaceMatcher, MATCH_DISTANCE_THRESHOLD, parse_label
+from backend.services.faceAnalysisService import as_face_analysis
+from backend.services.databaseService import get_connection
 
 # 📌 Paths
 DATABASE_PATH = "backend/data/voters.db"
-KNN_MODEL_PATH = "backend/data/knn_candidate.pkl"
-SCALER_PATH = "backend/data/scaler_candidate.pkl"
-CNN_MODEL_PATH = "backend/models/mmod_human_face_detector.dat"
-FACE_REC_MODEL_PATH = "backend/models/dlib_face_recognition_resnet_model_v1.dat"
-PREDICTOR_PATH = "backend/models/shape_predictor_68_face_landmarks.dat"
+CANDIDATE_DATASET_PATH = "backend/data/candidate_embeddings"  # .npy + .labels.json
+CANDIDATE_FACES_PATH = "backend/data/candidate_faces.pkl"  # Legacy pickles
+CANDIDATE_NAMES_PATH = "backend/data/candidate_names.pkl"
+CANDIDATE_GALLERY_PATH = "backend/data/candidate_gallery.npz"
 
 # ✅ Setup Logging
 logging.basicConfig(
@@ -29,124 +33,179 @@ console_handler.setLevel(logging.INFO)
 console_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
 logging.getLogger().addHandler(console_handler)
 
-# ✅ Load Dlib Models
-try:
-    cnn_detector = dlib.cnn_face_detection_model_v1(CNN_MODEL_PATH) if os.path.exists(CNN_MODEL_PATH) else None
-    face_recognizer = dlib.face_recognition_model_v1(FACE_REC_MODEL_PATH) if os.path.exists(FACE_REC_MODEL_PATH) else None
-    landmark_predictor = dlib.shape_predictor(PREDICTOR_PATH) if os.path.exists(PREDICTOR_PATH) else None
-
-    if not cnn_detector:
-        logging.error("❌ CNN model missing! Download from http://dlib.net/files/mmod_human_face_detector.dat.bz2")
-    if not face_recognizer:
-        logging.error("❌ Face Recognition Model missing! Download from http://dlib.net/files/dlib_face_recognition_resnet_model_v1.dat.bz2")
-    if not landmark_predictor:
-        logging.error("❌ Shape Predictor missing! Download from http://dlib.net/files/shape_predictor_68_face_landmarks.dat.bz2")
-
-except Exception as e:
-    logging.error(f"❌ Error loading Dlib models: {str(e)}")
-
-# ✅ Load KNN Model & Scaler
-knn_candidate, scaler_candidate = None, None
-if os.path.exists(KNN_MODEL_PATH) and os.path.exists(SCALER_PATH):
+# ✅ Load Candidate Embedding Gallery (incremental .npz, else the dataset written by train_knn.py, else legacy pickles)
+def load_candidate_matcher():
+    """Builds a FaceMatcher from the persisted candidate gallery, the embedding dataset or the pickled embeddings and labels."""
+    gallery = FaceGallery.load(CANDIDATE_GALLERY_PATH)
+    if gallery is not None:
+        return FaceMatcher(gallery)
+
+    try:
+        dataset = load_dataset(CANDIDATE_DATASET_PATH)
+    except ValueError as e:
+        logging.error(f"❌ Error loading candidate dataset: {str(e)}")
+        dataset = None
+    if dataset is not None:
+        ids, names = zip(*(parse_label(label) for label in dataset.labels)) if len(dataset) else ((), ())
+        matcher = FaceMatcher(FaceGallery(ids, names, dataset.features))
+        logging.info(f"✅ Candidate gallery loaded from dataset v{dataset.version} ({len(matcher)} faces)!")
+        return matcher
+
+    if not (os.path.exists(CANDIDATE_FACES_PATH) and os.path.exists(CANDIDATE_NAMES_PATH)):
+        logging.warning("⚠️ Candidate embeddings not found! Train the model before running face recognition.")
+        return None
+
     try:
-        with open(KNN_MODEL_PATH, "rb") as f:
-            knn_candidate = pickle.load(f)
-        with open(SCALER_PATH, "rb") as f:
-            scaler_candidate = pickle.load(f)
-
-        logging.info("✅ Candidate KNN model and Scaler loaded successfully!")
-    except (pickle.UnpicklingError, EOFError) as e:
-        logging.error(f"❌ Error loading KNN model: {str(e)}")
-        knn_candidate, scaler_candidate = None, None
-else:
-    logging.warning("⚠️ Candidate KNN model not found! Train the model before running face recognition.")
+        with open(CANDIDATE_FACES_PATH, "rb") as f:
+            faces = pickle.load(f)
+        with open(CANDIDATE_NAMES_PATH, "rb") as f:
+            labels = pickle.load(f)
+
+        ids, names = zip(*(parse_label(label) for label in labels)) if labels else ((), ())
+        matcher = FaceMatcher(FaceGallery(ids, names, np.array(faces, dtype=np.float32)))
+        logging.info(f"✅ Candidate gallery loaded successfully ({len(matcher)} faces)!")
+        return matcher
+    except (pickle.UnpicklingError, EOFError, ValueError) as e:
+        logging.error(f"❌ Error loading candidate embeddings: {str(e)}")
+        return None
+
+candidate_matcher = load_candidate_matcher()
+candidate_lock = threading.Lock()
+
+def candidate_model_version():
+    """Version of the candidate gallery currently serving requests (None until one exists)."""
+    matcher = candidate_matcher
+    return matcher.gallery.version if matcher is not None else None
+
+def candidate_gallery_revision():
+    """Revision of the candidate gallery currently serving requests (None until one exists)."""
+    matcher = candidate_matcher
+    return matcher.gallery.revision if matcher is not None else None
+
+# ✅ Hot Reload of a Gallery Saved by Another Process
+def reload_candidate_gallery():
+    """
+    Applies candidates other workers appended to the live gallery; if the file was rewritten instead,
+    loads it off to the side, then swaps it in with one assignment.
+    """
+    global candidate_matcher
+
+    matcher = candidate_matcher
+    if matcher is not None and matcher.gallery.catch_up(CANDIDATE_GALLERY_PATH, add=matcher.add):
+        return {"status": "success", "message": f"Candidate gallery caught up ({len(matcher)} faces).", "model_version": matcher.gallery.version}
+
+    gallery = FaceGallery.load(CANDIDATE_GALLERY_PATH)
+    if gallery is None:
+        return {"status": "error", "message": "No saved candidate gallery to load."}
+
+    with candidate_lock:
+        candidate_matcher = FaceMatcher(gallery)
+    logging.info(f"✅ Candidate gallery v{gallery.version} is now live.")
+    return {"status": "success", "message": f"Candidate gallery reloaded with {len(gallery)} faces.", "model_version": gallery.version}
+
+gallery_watcher.watch(CANDIDATE_GALLERY_PATH, candidate_gallery_revision, reload_candidate_gallery)
+
+# ✅ Enroll a Newly Registered Candidate Into the Gallery
+def enroll_candidate_face(universityID, name, image_bytes):
+    """Embeds a single registration photo and appends it to the candidate gallery's log."""
+    global candidate_matcher
+
+    embedding = embed_image_bytes([image_bytes])[0]
+    if embedding is None:
+        return {"status": "error", "message": "No usable face in registration image."}
+
+    while True:
+        with candidate_lock:
+            if candidate_matcher is None:
+                candidate_matcher = FaceMatcher()
+            matcher = candidate_matcher
+        if matcher.gallery.append(CANDIDATE_GALLERY_PATH, [(universityID, name, embedding)], add=matcher.add):
+            break
+        reload_candidate_gallery()  # Another worker rewrote the gallery: enroll into its version instead
+
+    with matcher.gallery.writing(CANDIDATE_GALLERY_PATH):
+        if matcher.gallery.catch_up(CANDIDATE_GALLERY_PATH, add=matcher.add) and matcher.gallery.needs_compaction:
+            matcher.gallery.save(CANDIDATE_GALLERY_PATH)
+    return {"status": "success", "message": "Candidate face enrolled."}
+
+# ✅ Full Rebuild From the `candidates` Table (on demand only)
+def rebuild_candidate_gallery():
+    """Re-embeds every stored candidate image and swaps in the new gallery."""
+    global candidate_matcher
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT candidates.universityID, candidates.firstname, candidates.lastname, face_images.image FROM candidates
+        JOIN face_images ON face_images.hash = candidates.image_hash
+    """)
+    candidate_data = cursor.fetchall()
+
+    ids, names, embeddings = [], [], []
+    cached = embed_image_bytes([image_blob for _, _, _, image_blob in candidate_data])
+    for (universityID, firstname, lastname, _), embedding in zip(candidate_data, cached):
+        if embedding is None:
+            logging.warning(f"⚠️ No usable face for candidate {universityID}. Skipping...")
+            continue
+        ids.append(universityID)
+        names.append(f"{firstname} {lastname}")
+        embeddings.append(embedding)
+
+    gallery = FaceGallery(ids, names, np.array(embeddings, dtype=np.float32))
+    gallery.save(CANDIDATE_GALLERY_PATH)
+    with candidate_lock:
+        candidate_matcher = FaceMatcher(gallery)
+    logging.info(f"✅ Candidate gallery rebuilt with {len(gallery)} embeddings.")
+    return {"status": "success", "message": f"Candidate gallery rebuilt with {len(gallery)} faces."}
 
 # ✅ Check for Blurry Images
 def is_blurry(image, threshold=50):
     """Detects blur using Laplacian variance method."""
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    variance = cv2.Laplacian(gray, cv2.CV_64F).var()
-    return variance < threshold
+    return as_face_analysis(image).is_blurry(threshold)
 
 # ✅ Recognize Candidate Face
-def recognize_candidate_face(image_array):
-    """Recognizes a candidate's face using KNN with CNN detection."""
-    global knn_candidate, scaler_candidate
-
-    if knn_candidate is None or scaler_candidate is None:
-        logging.error("❌ Candidate KNN Model or Scaler not loaded!")
+@reports_version(lambda: candidate_matcher)
+def recognize_candidate_face(image_array, matcher=None):
+    """Recognizes a candidate's face by matching its embedding against the candidate gallery."""
+    if matcher is None or len(matcher) == 0:
+        logging.error("❌ Candidate gallery not loaded!")
         return {"status": "error", "message": "Face recognition unavailable. Train the model first."}
 
-    if cnn_detector is None or face_recognizer is None or landmark_predictor is None:
-        logging.error("❌ One or more Dlib models are missing!")
-        return {"status": "error", "message": "Face recognition model files are missing!"}
-
     try:
-        if is_blurry(image_array):
+        analysis = as_face_analysis(image_array)
+        if analysis.is_blurry():
             return {"status": "error", "message": "Image is too blurry for recognition. Use a clearer image."}
 
-        # ✅ Convert Image to RGB (Required for Dlib)
-        rgb_image = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
-
-        # ✅ Detect Faces using CNN Detector
-        faces = cnn_detector(rgb_image)
-        logging.info(f"👀 Detected Faces: {len(faces)}")
+        # ✅ Detect Faces (cheap detector first, MMOD fallback)
+        logging.info(f"👀 Detected Faces: {len(analysis.faces)}")
 
-        if len(faces) == 0:
+        if len(analysis.faces) == 0:
             return {"status": "error", "message": "No face detected"}
 
-        for face in faces:
-            # Extract landmarks & embeddings
-            shape = landmark_predictor(rgb_image, face.rect)
-            face_embedding = np.array(face_recognizer.compute_face_descriptor(rgb_image, shape))
-            face_embedding = face_embedding / np.linalg.norm(face_embedding)  # ✅ Normalize to unit vector
-
-            # ✅ Normalize & Scale the Face Embedding (No Flattening)
-            try:
-                processed_face = scaler_candidate.transform(face_embedding.reshape(1, -1))
-                logging.info(f"🔍 Scaled Face Embedding (First 5 values): {processed_face[0][:5]}")
-
-            except Exception as e:
-                logging.error(f"⚠️ Error during scaling: {str(e)}")
-                return {"status": "error", "message": "Error in face scaling. Try retraining the model."}
-
-            # ✅ Predict Using Candidate KNN
-            distances, indices = knn_candidate.kneighbors(processed_face, n_neighbors=1)
-            logging.info(f"📏 KNN Distance: {distances[0][0]} | Recognized: {knn_candidate.predict(processed_face)[0]}")
-
-            recognized_user = knn_candidate.predict(processed_face)[0]
-
-            # ✅ Compute Confidence
-            max_distance = max(distances[0])  # Prevent division by zero
-            confidence = max(0.1, 1 - (distances[0][0] / max_distance))
-
-            logging.info(f"🎯 Recognized User: {recognized_user} | Confidence: {round(confidence, 2)}")
-
-            CONFIDENCE_THRESHOLD = 0.1# 🔥 Adjusted threshold to reduce false negatives
-
-            if confidence < CONFIDENCE_THRESHOLD:
-                logging.warning("⚠️ Low confidence score! Face may not be recognized correctly.")
-                return {"status": "error", "message": "Face recognition confidence too low."}
-
-            # ✅ Extract university ID correctly
-            recognized_parts = recognized_user.split()
-            if len(recognized_parts) > 1:
-                university_id = recognized_parts[-1][1:-1]  # Extract ID (e.g., "(1)" -> "1")
-                name = " ".join(recognized_parts[:-1])  # Extract Name
-            else:
-                university_id = recognized_user
-                name = recognized_user
-
-            return {
-                "status": "success",
-                "recognized_user": {
-                    "universityID": university_id,
-                    "name": name,
-                    "confidence": round(confidence, 2)
-                }
-            }
+        # ✅ Embed every detected face and query the gallery in one batch
+        distances, rows = matcher.search(analysis.embeddings, k=1)
+
+        best = int(np.argmin(distances[:, 0]))
+        distance = float(distances[best, 0])
+        row = int(rows[best, 0])
+        university_id = matcher.gallery.ids[row]
+        name = matcher.gallery.names[row]
+
+        logging.info(f"📏 Closest Candidate: {name} ({university_id}) | Distance: {round(distance, 4)}")
 
-        return {"status": "error", "message": "Face recognition failed"}
+        if distance >= MATCH_DISTANCE_THRESHOLD:
+            logging.warning("⚠️ Closest candidate is beyond the match threshold.")
+            return {"status": "error", "message": "Face recognition confidence too low."}
+
+        return {
+            "status": "success",
+            "recognized_user": {
+                "universityID": university_id,
+                "name": name,
+                "confidence": round(1 - distance, 2),
+                "distance": round(distance, 4)
+            }
+        }
 
     except Exception as e:
         logging.error(f"❌ Face recognition error: {str(e)}")
@@ -6,7 +6,8 @@ import os
 import subprocess
 import numpy as np
 import cv2
-from backend.services.databaseService import DATABASE_PATH
+from backend.services.databaseService import DATABASE_PATH, get_connection, store_face_image, load_face_images
+from backend.services.candidateRecognitionService import enroll_candidate_face, rebuild_candidate_gallery
 import sys 
 from pydantic import BaseModel  # ✅ Add this line
 
@@ -39,7 +40,7 @@ logging.info("✅ Candidate logging initialized successfully.")
 def initialize_database():
     os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
     try:
-        with sqlite3.connect(DATABASE_PATH) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS candidates (
@@ -49,7 +50,7 @@ def initialize_database():
                     email TEXT,
                     password TEXT,
                     aboutYourself TEXT,
-                    image BLOB
+                    image_hash TEXT
                 )
             """)
             conn.commit()
@@ -64,7 +65,7 @@ def hash_password(password):
 # ✅ Check if Candidate Exists
 def check_candidate_exists(universityID):
     try:
-        with sqlite3.connect(DATABASE_PATH) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT universityID FROM candidates WHERE universityID=?", (universityID,))
             return cursor.fetchone() is not None
@@ -75,19 +76,19 @@ def check_candidate_exists(universityID):
 def get_candidate(universityID: str):
     """Fetch candidate details from the database including the profile image."""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT universityID, firstname, lastname, email, aboutYourself, image FROM candidates WHERE universityID = ?", (universityID,))
+        cursor.execute("SELECT universityID, firstname, lastname, email, aboutYourself, image_hash FROM candidates WHERE universityID = ?", (universityID,))
         candidate = cursor.fetchone()
-        conn.close()
 
         if not candidate:
             return None
 
         # Convert BLOB image to Base64 (if exists)
         image_base64 = None
-        if candidate[5]:  # If image data exists
-            image_base64 = base64.b64encode(candidate[5]).decode("utf-8")
+        image_data = load_face_images([candidate[5]]).get(candidate[5])
+        if image_data:  # If image data exists
+            image_base64 = base64.b64encode(image_data).decode("utf-8")
 
         return {
             "universityID": candidate[0],
@@ -128,21 +129,23 @@ def register_new_candidate(candidate_data):
             logging.error(f"❌ Error decoding candidate image: {str(e)}")
             return {"status": "error", "message": "Invalid image format."}
 
-        # ✅ Insert into database
-        with sqlite3.connect(DATABASE_PATH) as conn:
+        # ✅ Insert into database (the photo goes to the shared image store)
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO candidates (universityID, firstname, lastname, email, password, aboutYourself, image)
+                INSERT INTO candidates (universityID, firstname, lastname, email, password, aboutYourself, image_hash)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
             """, (candidate_data["universityID"], candidate_data["firstname"], candidate_data["lastname"], 
-                  candidate_data["email"], hashed_password, candidate_data["aboutYourself"], image_data))
+                  candidate_data["email"], hashed_password, candidate_data["aboutYourself"], store_face_image(conn, image_data)))
             conn.commit()
 
         logging.info(f"✅ Candidate registered successfully: {candidate_data['universityID']}")
 
-        # ✅ Train Model After Registration
-        update_result = update_candidate_dataset_and_train()
-        logging.info(f"🔄 Model update result: {update_result}")
+        # ✅ Embed the new face once and append it to the candidate gallery
+        enroll_result = enroll_candidate_face(
+            candidate_data["universityID"], f"{candidate_data['firstname']} {candidate_data['lastname']}", image_data
+        )
+        logging.info(f"🧬 Gallery enrollment result: {enroll_result}")
 
         return {"status": "success", "message": "Candidate registered successfully!"}
 
@@ -150,31 +153,23 @@ def register_new_candidate(candidate_data):
         logging.error(f"❌ Database Error while registering candidate {candidate_data['universityID']}: {str(e)}")
         return {"status": "error", "message": "Database error while registering."}
 
-# ✅ Automatically Update Candidate Dataset & Train KNN Model
+# ✅ Rebuild the Candidate Gallery From Scratch (on demand)
 def update_candidate_dataset_and_train():
-    """Updates only candidate-related .pkl files and retrains the candidate-specific KNN model."""
+    """Re-embeds every stored candidate face. Registration does not call this; it enrolls incrementally."""
     try:
-        logging.info("🔄 Updating candidate dataset...")
+        logging.info("🔄 Rebuilding candidate gallery...")
+        result = rebuild_candidate_gallery()
+        logging.info(f"✅ {result['message']}")
+        return result
 
-        # ✅ Step 1: Run add_faces.py but ONLY for candidates
-        subprocess.run(["python", "backend/scripts/add_faces.py", "--only-candidates"], check=True)
-
-        logging.info("🔄 Retraining KNN model for CANDIDATES ONLY...")
-
-        # ✅ Step 2: Train only the candidate KNN model
-        subprocess.run(["python", "backend/scripts/train_knn.py", "--only-candidates"], check=True)
-
-        logging.info("✅ Candidate dataset updated & model retrained successfully!")
-        return {"status": "success", "message": "Candidate model updated successfully!"}
-
-    except subprocess.CalledProcessError as e:
-        logging.error(f"❌ Error during candidate model update: {str(e)}")
-        return {"status": "error", "message": "Candidate registered, but model update failed."}
+    except Exception as e:
+        logging.error(f"❌ Error during candidate gallery rebuild: {str(e)}")
+        return {"status": "error", "message": "Candidate gallery rebuild failed."}
 
 # ✅ Retrieve Candidate Password (Hashed)
 def get_candidate_password(universityID):
     try:
-        with sqlite3.connect(DATABASE_PATH) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT password FROM candidates WHERE universityID=?", (universityID,))
             result = cursor.fetchone()
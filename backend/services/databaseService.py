@@ -1,11 +1,142 @@
+import os
+import time
+import hashlib
 import sqlite3
 import logging
+import threading
+from contextlib import contextmanager
 import numpy as np
 import cv2
 
 # ✅ Database Path
 DATABASE_PATH = "backend/data/voters.db"
 
+# ✅ Connection Tuning (applied once to every pooled connection)
+#    WAL lets readers proceed while a vote is being written; synchronous=NORMAL is durable
+#    across application crashes and fsyncs only at WAL checkpoints.
+DB_BUSY_TIMEOUT = float(os.getenv("UNIVOTE_DB_BUSY_TIMEOUT", "30"))
+DB_SYNCHRONOUS = os.getenv("UNIVOTE_DB_SYNCHRONOUS", "NORMAL")
+DB_MMAP_SIZE = int(os.getenv("UNIVOTE_DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_CACHE_SIZE_KB = int(os.getenv("UNIVOTE_DB_CACHE_SIZE_KB", str(64 * 1024)))
+DB_STATEMENT_CACHE = int(os.getenv("UNIVOTE_DB_STATEMENT_CACHE", "256"))  # Prepared statements kept per connection
+
+_local = threading.local()
+
+
+# ✅ Per-Thread Persistent Connections
+def get_connection(path=DATABASE_PATH):
+    """
+    This thread's long-lived connection to `path`, opened on first use with WAL and tuned pragmas.
+    Use it as `with get_connection() as conn:` (commits or rolls back) and never close it.
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT, cached_statements=DB_STATEMENT_CACHE)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        connections[path] = conn
+    return conn
+
+
+@contextmanager
+def transaction(path=DATABASE_PATH, immediate=False):
+    """Explicit transaction on this thread's connection; `immediate` takes the write lock up front."""
+    conn = get_connection(path)
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+# ✅ Content-Addressed Face Images
+#    Photos live once in `face_images`, keyed by their SHA-256; `voters` and `candidates` rows only carry
+#    `image_hash`, so scanning them never pulls photo pages through the cache. Join on the hash to load bytes.
+def image_hash(image_bytes):
+    """Content key of an encoded image (SHA-256 hex digest)."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def initialize_image_store(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS face_images (
+            hash TEXT PRIMARY KEY,
+            image BLOB NOT NULL,
+            created_at REAL NOT NULL
+        )
+    """)
+
+
+def store_face_image(conn, image_bytes):
+    """Adds the photo to `face_images` (a no-op if already stored) inside the caller's transaction. Returns its hash."""
+    key = image_hash(image_bytes)
+    conn.execute("INSERT OR IGNORE INTO face_images (hash, image, created_at) VALUES (?, ?, ?)", (key, image_bytes, time.time()))
+    return key
+
+
+def load_face_images(hashes):
+    """{hash: image bytes} for the requested hashes that are stored."""
+    found = {}
+    unique = [key for key in dict.fromkeys(hashes) if key]
+    conn = get_connection()
+    for start in range(0, len(unique), 500):
+        chunk = unique[start:start + 500]
+        found.update(conn.execute(
+            f"SELECT hash, image FROM face_images WHERE hash IN ({','.join('?' * len(chunk))})", chunk
+        ).fetchall())
+    return found
+
+
+def migrate_inline_images(table):
+    """
+    One-off upgrade of a `voters` / `candidates` table created with an inline `image` BLOB:
+    adds `image_hash`, moves every photo into `face_images`, drops the inline column and vacuums.
+    Cheap no-op once the table is in the new layout (or does not exist yet). Run once at startup,
+    before anything reads photos through `face_images`.
+    """
+    def table_columns():
+        return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+    def migrated(columns):
+        return not columns or ("image_hash" in columns and "image" not in columns)
+
+    conn = get_connection()
+    if migrated(table_columns()):
+        initialize_image_store(conn)
+        return 0
+
+    moved = 0
+    with transaction(immediate=True):
+        initialize_image_store(conn)
+        columns = table_columns()  # Re-read under the write lock: another worker may have migrated meanwhile
+        if migrated(columns):
+            return 0
+        if "image_hash" not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN image_hash TEXT")
+        if "image" in columns:
+            rows = conn.execute(f"SELECT universityID, image FROM {table} WHERE image IS NOT NULL").fetchall()
+            conn.executemany(
+                f"UPDATE {table} SET image_hash=?, image=NULL WHERE universityID=?",
+                [(store_face_image(conn, image), universityID) for universityID, image in rows],
+            )
+            moved = len(rows)
+            if sqlite3.sqlite_version_info >= (3, 35, 0):
+                conn.execute(f"ALTER TABLE {table} DROP COLUMN image")  # Older SQLite keeps the (now NULL) column
+    if moved:
+        conn.execute("VACUUM")  # Give the freed BLOB pages back so the row table is compact on disk too
+        logging.info(f"📦 Moved {moved} inline photo(s) from `{table}` to `face_images`.")
+    return moved
+
 
 # ✅ Configure Logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -21,11 +152,14 @@ def fetch_all_voters_faces():
         logging.info("📡 Fetching all voter face images from the database...")
 
         # ✅ Connect to SQLite Database
-        conn = sqlite3.connect(DATABASE)
+        conn = get_connection()
         cursor = conn.cursor()
 
         # ✅ Execute Query
-        cursor.execute("SELECT universityID, image FROM voters")
+        cursor.execute("""
+            SELECT voters.universityID, face_images.image FROM voters
+            LEFT JOIN face_images ON face_images.hash = voters.image_hash
+        """)
         stored_faces = cursor.fetchall()
 
         if not stored_faces:
@@ -61,9 +195,4 @@ def fetch_all_voters_faces():
     except sqlite3.Error as db_error:
         logging.error(f"❌ Database error fetching voters' faces: {str(db_error)}")
 
-    finally:
-        # ✅ Ensure Database Connection is Closed
-        if conn:
-            conn.close()
-
     return results
@@ -0,0 +1,118 @@
+import os
+import time
+import logging
+import threading
+import numpy as np
+from backend.services.enrollmentStageService import run_enrollment_stage, image_hash
+from backend.services.faceDetectorService import DETECTOR_POLICIES, DETECTION_MAX_SIDE, DECODE_MAX_SIDE
+from backend.services.faceGalleryService import EMBEDDING_DIM
+from backend.services.modelRegistryService import FACE_REC_MODEL_PATH
+from backend.utils.profiler import profile_stage
+from backend.services.databaseService import get_connection
+
+# 📌 Paths
+EMBEDDING_CACHE_PATH = os.getenv("UNIVOTE_EMBEDDING_CACHE", "backend/data/embedding_cache.db")
+EMBEDDING_CACHE_ENABLED = os.getenv("UNIVOTE_EMBEDDING_CACHE_ENABLED", "1") == "1"
+
+
+def model_version(site="training"):
+    """Everything that changes the embedding of a given image: recognizer weights, detector cascade, resolutions."""
+    return f"{os.path.basename(FACE_REC_MODEL_PATH)}|{DETECTOR_POLICIES[site]}|{DETECTION_MAX_SIDE}|{DECODE_MAX_SIDE}"
+
+
+class EmbeddingCache:
+    """
+    SQLite sidecar mapping (SHA-256 of the encoded image, model version) → 128-D embedding.
+    Images without a usable face are cached too (NULL embedding), so they are not re-detected either.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _conn(self):
+        conn = get_connection(self.path)
+        if not getattr(self._local, "ready", False):
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    hash TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    embedding BLOB,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (hash, model)
+                )
+            """)
+            conn.commit()
+            self._local.ready = True
+        return conn
+
+    def get_many(self, hashes, model):
+        """{hash: embedding or None} for every hash already cached under `model`."""
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        for start in range(0, len(unique), 500):
+            chunk = unique[start:start + 500]
+            rows = self._conn().execute(
+                f"SELECT hash, embedding FROM embeddings WHERE model=? AND hash IN ({','.join('?' * len(chunk))})",
+                [model, *chunk],
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32).copy() if blob is not None else None
+        return found
+
+    def put_many(self, entries, model):
+        """Stores (hash, embedding or None) pairs under `model`."""
+        conn = self._conn()
+        now = time.time()
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (hash, model, embedding, created_at) VALUES (?, ?, ?, ?)",
+            [(key, model, np.asarray(embedding, dtype=np.float32).reshape(EMBEDDING_DIM).tobytes() if embedding is not None else None, now)
+             for key, embedding in entries],
+        )
+        conn.commit()
+
+    # ✅ Embed Through the Cache
+    def embed(self, blobs, site="training", embed_fn=None):
+        """
+        First-face embedding (or None) for each encoded image. Only images never seen under the current
+        model version reach `embed_fn(blobs)`, which may fan out to worker processes.
+        """
+        embed_fn = embed_fn or (lambda misses: run_enrollment_stage(misses, site=site))
+        model = model_version(site)
+        with profile_stage("cache_lookup", len(blobs)):
+            hashes = [image_hash(blob) for blob in blobs]
+            cached = self.get_many(hashes, model)
+
+        misses = {}
+        for key, blob in zip(hashes, blobs):
+            if key not in cached:
+                misses.setdefault(key, blob)
+
+        if misses:
+            embedded = embed_fn(list(misses.values()))
+            fresh = list(zip(misses.keys(), embedded))
+            self.put_many(fresh, model)
+            cached.update(fresh)
+
+        with self._lock:
+            self.misses += len(misses)
+            self.hits += len(blobs) - len(misses)
+        logging.debug(f"🗃️ Embedding cache: {len(blobs) - len(misses)} hit(s), {len(misses)} miss(es)")
+        return [cached[key] for key in hashes]
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "path": self.path}
+
+
+embedding_cache = EmbeddingCache()
+
+
+def embed_image_bytes(blobs, site="training", embed_fn=None):
+    """Cached `run_enrollment_stage` (see EmbeddingCache.embed); bypasses the cache when it is disabled."""
+    if not EMBEDDING_CACHE_ENABLED:
+        return embed_fn(blobs) if embed_fn else run_enrollment_stage(blobs, site=site)
+    return embedding_cache.embed(blobs, site=site, embed_fn=embed_fn)
@@ -0,0 +1,154 @@
+import os
+import time
+import logging
+import threading
+from backend.services.faceRecognitionService import enroll_voter_faces
+from backend.services.databaseService import get_connection, transaction
+
+# ✅ Coalescing Limits
+#    After the first job of a burst arrives the worker waits ENROLLMENT_COALESCE_MS for more,
+#    then embeds up to ENROLLMENT_BATCH_SIZE registrations in one pass and saves the gallery once.
+ENROLLMENT_BATCH_SIZE = int(os.getenv("UNIVOTE_ENROLLMENT_BATCH_SIZE", "32"))
+ENROLLMENT_COALESCE_MS = float(os.getenv("UNIVOTE_ENROLLMENT_COALESCE_MS", "200"))
+ENROLLMENT_POLL_SECONDS = 5.0
+# ✅ A job still 'running' this long after it was claimed belongs to a worker that died mid-batch
+ENROLLMENT_STALE_SECONDS = float(os.getenv("UNIVOTE_ENROLLMENT_STALE_SECONDS", "600"))
+
+
+JOB_COLUMNS = ("id", "universityID", "name", "status", "message", "created_at", "updated_at")
+
+
+# ✅ Persistent Job Table (lives next to `voters` so jobs survive a restart)
+def initialize_queue():
+    with get_connection() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS enrollment_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                universityID TEXT NOT NULL,
+                name TEXT,
+                status TEXT NOT NULL DEFAULT 'queued',
+                message TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_enrollment_jobs_status ON enrollment_jobs (status, id)")
+
+
+class EnrollmentWorker:
+    """
+    Background thread draining `enrollment_jobs`: queued → running → done | failed.
+    Registration only inserts a job row; face embedding and gallery writes happen here, one batch at a time.
+    Every API worker runs one: jobs are claimed under BEGIN IMMEDIATE and the gallery file under its write lock.
+    """
+
+    def __init__(self, batch_size=ENROLLMENT_BATCH_SIZE, coalesce_ms=ENROLLMENT_COALESCE_MS):
+        self.batch_size = max(1, batch_size)
+        self.coalesce = max(0.0, coalesce_ms) / 1000.0
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # ✅ Enqueue
+    def submit(self, universityID, name):
+        """Queues enrollment of a voter whose row (and photo) is already in `voters`. Returns the job ID."""
+        self.start()
+        now = time.time()
+        with get_connection() as conn:
+            cursor = conn.execute(
+                "INSERT INTO enrollment_jobs (universityID, name, status, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?)",
+                (universityID, name, now, now),
+            )
+            job_id = cursor.lastrowid
+        self._wake.set()
+        return job_id
+
+    # ✅ Job Status
+    def status(self, job_id):
+        """Job row plus its position in the queue, or None if the job does not exist."""
+        self.start()
+        with get_connection() as conn:
+            row = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM enrollment_jobs WHERE id=?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = dict(zip(JOB_COLUMNS, row))
+            if job["status"] == "queued":
+                job["position"] = conn.execute(
+                    "SELECT COUNT(*) FROM enrollment_jobs WHERE status='queued' AND id<?", (job_id,)
+                ).fetchone()[0]
+        return job
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                initialize_queue()
+                self._thread = threading.Thread(target=self._run, name="enrollment-worker", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(ENROLLMENT_POLL_SECONDS)
+            self._wake.clear()
+            time.sleep(self.coalesce)
+            try:
+                while self._drain_batch():
+                    pass
+            except Exception as e:
+                logging.error(f"❌ Enrollment worker error: {str(e)}")
+
+    # ✅ Claim Up to `batch_size` Jobs and Enroll Them Together
+    def _claim(self):
+        with transaction(immediate=True) as conn:
+            # Jobs claimed by a worker that died mid-batch go back to the queue; other workers' live batches stay put
+            conn.execute(
+                "UPDATE enrollment_jobs SET status='queued' WHERE status='running' AND updated_at<?",
+                (time.time() - ENROLLMENT_STALE_SECONDS,),
+            )
+            jobs = [
+                dict(zip(("id", "universityID", "name"), row)) for row in conn.execute(
+                    "SELECT id, universityID, name FROM enrollment_jobs WHERE status='queued' ORDER BY id LIMIT ?",
+                    (self.batch_size,),
+                ).fetchall()
+            ]
+            conn.executemany(
+                "UPDATE enrollment_jobs SET status='running', updated_at=? WHERE id=?",
+                [(time.time(), job["id"]) for job in jobs],
+            )
+        return jobs
+
+    def _drain_batch(self):
+        jobs = self._claim()
+        if not jobs:
+            return False
+
+        with get_connection() as conn:
+            placeholders = ",".join("?" * len(jobs))
+            images = dict(conn.execute(
+                f"SELECT voters.universityID, face_images.image FROM voters "
+                f"JOIN face_images ON face_images.hash = voters.image_hash WHERE voters.universityID IN ({placeholders})",
+                [job["universityID"] for job in jobs],
+            ).fetchall())
+
+        found = [job for job in jobs if job["universityID"] in images]
+        outcomes = {job["id"]: {"status": "error", "message": "Voter has no stored photo."} for job in jobs}
+        try:
+            results = enroll_voter_faces([(job["universityID"], job["name"], images[job["universityID"]]) for job in found])
+            outcomes.update({job["id"]: result for job, result in zip(found, results)})
+        except Exception as e:
+            logging.error(f"❌ Enrollment batch of {len(found)} failed: {str(e)}")
+            outcomes.update({job["id"]: {"status": "error", "message": f"Enrollment error: {str(e)}"} for job in found})
+
+        now = time.time()
+        with get_connection() as conn:
+            conn.executemany(
+                "UPDATE enrollment_jobs SET status=?, message=?, updated_at=? WHERE id=?",
+                [("done" if outcome["status"] == "success" else "failed", outcome["message"], now, job_id)
+                 for job_id, outcome in outcomes.items()],
+            )
+        logging.info(f"🧬 Enrolled batch of {len(jobs)} voter(s): {sum(o['status'] == 'success' for o in outcomes.values())} succeeded")
+        return True
+
+
+enrollment_worker = EnrollmentWorker()
@@ -0,0 +1,44 @@
+import os
+import cv2
+from backend.services.faceDetectorService import decode_image
+from backend.services.faceAnalysisService import align_first_faces, embed_chips
+from backend.utils.profiler import profile_stage
+from backend.services.databaseService import image_hash
+
+# 📌 Paths
+FACE_CHIP_DIR = "backend/data/chips"  # Aligned chips, one JPEG per source image: <sha256>.jpg
+
+# ✅ Ensure necessary directories exist
+os.makedirs(FACE_CHIP_DIR, exist_ok=True)
+
+
+def chip_path(image_hash):
+    return os.path.join(FACE_CHIP_DIR, f"{image_hash}.jpg")
+
+
+# ✅ The Enrollment Stage: decode → detect → landmarks → aligned chip → embedding
+def run_enrollment_stage(blobs, site="training"):
+    """
+    Runs every encoded image through the single enrollment pipeline, once.
+    Each aligned chip is written to FACE_CHIP_DIR under the image's content hash.
+    Safe to run in a worker process.
+    :return: one 128-D embedding, or None (undecodable / no face), per image.
+    """
+    with profile_stage("decode", len(blobs)):
+        images = [decode_image(blob) for blob in blobs]
+    valid = [i for i, image in enumerate(images) if image is not None]
+    with profile_stage("detect+align", len(valid)):
+        chips = align_first_faces([images[i] for i in valid], site=site) if valid else []
+
+    aligned = [(i, chip) for i, chip in zip(valid, chips) if chip is not None]
+    with profile_stage("embed", len(aligned)):
+        embeddings = embed_chips([chip for _, chip in aligned])
+
+    results = [None] * len(blobs)
+    with profile_stage("write_chips", len(aligned)):
+        for (i, chip), embedding in zip(aligned, embeddings):
+            path = chip_path(image_hash(blobs[i]))
+            cv2.imwrite(f"{path}.tmp.jpg", cv2.cvtColor(chip, cv2.COLOR_RGB2BGR))
+            os.replace(f"{path}.tmp.jpg", path)
+            results[i] = embedding
+    return results
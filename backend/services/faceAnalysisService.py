@@ -0,0 +1,147 @@
+import cv2
+import dlib
+import numpy as np
+from backend.services.faceDetectorService import detect_faces, detect_faces_batch
+from backend.services.faceBatchService import MicroBatcher, BATCHING_ENABLED
+from backend.services.faceGalleryService import EMBEDDING_DIM
+from backend.services.modelRegistryService import get_model
+
+# ✅ Batched Stages Shared by Concurrent Requests
+def _detect_batch(items):
+    """items: (image, site) pairs → one detection list per item, batched per site."""
+    results = [None] * len(items)
+    by_site = {}
+    for i, (_, site) in enumerate(items):
+        by_site.setdefault(site, []).append(i)
+    for site, indices in by_site.items():
+        for i, faces in zip(indices, detect_faces_batch([items[i][0] for i in indices], site=site)):
+            results[i] = faces
+    return results
+
+
+def _embed_batch(items):
+    """items: (rgb_image, [landmarks, ...]) pairs → one (n, 128) descriptor array per item."""
+    images, shapes = [], []
+    for rgb_image, landmarks in items:
+        detections = dlib.full_object_detections()
+        for shape in landmarks:
+            detections.append(shape)
+        images.append(rgb_image)
+        shapes.append(detections)
+
+    descriptors = get_model("recognizer").compute_face_descriptor(images, shapes)
+    return [np.array([np.array(d) for d in per_image], dtype=np.float32).reshape(-1, EMBEDDING_DIM) for per_image in descriptors]
+
+
+detection_batcher = MicroBatcher(_detect_batch, "detection")
+embedding_batcher = MicroBatcher(_embed_batch, "embedding")
+
+
+class FaceAnalysis:
+    """
+    Everything derived from one BGR image, computed lazily and at most once:
+    grayscale/RGB conversions, blur score, detections, 68-point landmarks and embeddings.
+    Pass the same instance through blur gating, liveness, matching and fallback.
+    """
+
+    def __init__(self, image, site="recognition"):
+        self.image = image
+        self.site = site
+        self._gray = None
+        self._rgb = None
+        self._blur_variance = None
+        self._faces = None
+        self._landmarks = {}
+        self._embeddings = {}
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def rgb(self):
+        if self._rgb is None:
+            self._rgb = cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
+        return self._rgb
+
+    # ✅ Blur Gate (Laplacian variance)
+    @property
+    def blur_variance(self):
+        if self._blur_variance is None:
+            self._blur_variance = cv2.Laplacian(self.gray, cv2.CV_64F).var()
+        return self._blur_variance
+
+    def is_blurry(self, threshold=50):
+        return self.blur_variance < threshold
+
+    # ✅ Detections (dlib.rectangle in image coordinates)
+    @property
+    def faces(self):
+        if self._faces is None:
+            if BATCHING_ENABLED:
+                self._faces = detection_batcher.submit((self.image, self.site)).result()
+            else:
+                self._faces = detect_faces(self.image, site=self.site)
+        return self._faces
+
+    def landmarks(self, index=0):
+        """68-point landmarks of face `index`."""
+        if index not in self._landmarks:
+            self._landmarks[index] = get_model("predictor")(self.rgb, self.faces[index])
+        return self._landmarks[index]
+
+    def embedding(self, index=0):
+        """128-D dlib descriptor of face `index`."""
+        if index not in self._embeddings:
+            self._embed([index])
+        return self._embeddings[index]
+
+    @property
+    def embeddings(self):
+        """(n_faces, 128) descriptors of every detected face."""
+        if not self.faces:
+            return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        missing = [index for index in range(len(self.faces)) if index not in self._embeddings]
+        if missing:
+            self._embed(missing)
+        return np.stack([self._embeddings[index] for index in range(len(self.faces))])
+
+    def _embed(self, indices):
+        if BATCHING_ENABLED:
+            descriptors = embedding_batcher.submit((self.rgb, [self.landmarks(index) for index in indices])).result()
+        else:
+            descriptors = [get_model("recognizer").compute_face_descriptor(self.rgb, self.landmarks(index)) for index in indices]
+        for index, descriptor in zip(indices, descriptors):
+            self._embeddings[index] = np.array(descriptor, dtype=np.float32)
+
+
+def as_face_analysis(image, site="recognition"):
+    """Wraps a raw BGR image, or passes an existing FaceAnalysis through unchanged."""
+    return image if isinstance(image, FaceAnalysis) else FaceAnalysis(image, site=site)
+
+
+# ✅ Aligned Face Chips (exactly what the ResNet recognizer sees)
+FACE_CHIP_SIZE = 150
+FACE_CHIP_PADDING = 0.25
+
+
+def align_first_faces(images, site="training"):
+    """Landmark-aligned 150x150 RGB chip of the first detected face, or None, for each BGR image (one detection batch)."""
+    chips = [None] * len(images)
+    for i, (image, faces) in enumerate(zip(images, detect_faces_batch(images, site=site))):
+        if faces:
+            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            shape = get_model("predictor")(rgb_image, faces[0])
+            chips[i] = dlib.get_face_chip(rgb_image, shape, size=FACE_CHIP_SIZE, padding=FACE_CHIP_PADDING)
+    return chips
+
+
+def embed_chips(chips):
+    """(n, 128) descriptors of aligned chips in one batch; identical to embedding the source image with its landmarks."""
+    if not chips:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+    descriptors = get_model("recognizer").compute_face_descriptor(chips)
+    return np.array([np.array(d) for d in descriptors], dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+
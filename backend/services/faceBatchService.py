@@ -0,0 +1,86 @@
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+# ✅ Micro-Batching Limits
+#    A batch is flushed once it holds BATCH_MAX_SIZE items or its first item has waited BATCH_MAX_WAIT_MS.
+BATCHING_ENABLED = os.getenv("UNIVOTE_BATCHING", "1") == "1"
+BATCH_MAX_SIZE = int(os.getenv("UNIVOTE_BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.getenv("UNIVOTE_BATCH_MAX_WAIT_MS", "5"))
+
+
+class MicroBatcher:
+    """
+    Gathers items submitted from many request threads and hands them to `process_batch` together.
+    `process_batch(items)` must return one result per item, in order; each caller gets a Future.
+    """
+
+    def __init__(self, process_batch, name, max_batch=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        self.process_batch = process_batch
+        self.name = name
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    # ✅ Submit One Item
+    def submit(self, item):
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future))
+        return future
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                # (Re)started on demand, so a worker that died does not strand every later submit
+                self._worker = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+                self._worker.start()
+
+    # ✅ Collect Up to `max_batch` Items or `max_wait` Seconds, Then Run Them Together
+    def _run(self):
+        futures = []
+        try:
+            while True:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.max_wait
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                # Callers may cancel a waiting item; once marked running it can no longer be cancelled
+                batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+                if not batch:
+                    continue
+                items = [item for item, _ in batch]
+                futures = [future for _, future in batch]
+                try:
+                    results = self.process_batch(items)
+                    if len(results) != len(items):
+                        raise RuntimeError(f"expected {len(items)} results, got {len(results)}")
+                except Exception as e:
+                    logging.error(f"❌ {self.name} batch of {len(items)} failed: {str(e)}")
+                    for future in futures:
+                        future.set_exception(e)
+                    futures = []
+                    continue
+
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+                futures = []
+        finally:
+            # Only reached if the worker itself dies: fail its batch so no caller waits forever
+            # (items still queued are picked up by the worker the next submit starts)
+            error = RuntimeError(f"{self.name} batcher stopped")
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
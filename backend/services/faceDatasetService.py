@@ -0,0 +1,85 @@
+import os
+import json
+import logging
+import numpy as np
+from backend.services.faceGalleryService import new_version
+
+# ✅ On-Disk Face Dataset
+#    <prefix>.npy          fixed-dtype (rows, dim) feature matrix with the standard .npy header
+#    <prefix>.labels.json  format/version stamp, dtype, shape and one label per row
+#    The matrix is opened with np.memmap, so loading is zero-copy and worker processes
+#    reading the same dataset share its pages through the OS page cache.
+DATASET_FORMAT = 1
+
+
+def dataset_paths(prefix):
+    """(matrix path, label table path) of the dataset stored under `prefix`."""
+    return f"{prefix}.npy", f"{prefix}.labels.json"
+
+
+class FaceDataset:
+    """Feature matrix (memory-mapped, read-only) plus the label of every row."""
+
+    def __init__(self, features, labels, version):
+        self.features = features
+        self.labels = labels
+        self.version = version
+
+    def __len__(self):
+        return len(self.labels)
+
+
+# ✅ Save (matrix first, then the label table that commits it)
+def save_dataset(prefix, features, labels, dtype=np.float32):
+    """
+    Writes `features` (array, list of rows or memmap) and `labels` under a new version.
+    Both files are written to temporary names and renamed into place.
+    :return: the new version string.
+    """
+    features = np.asarray(features, dtype=dtype)
+    if features.ndim != 2:
+        features = features.reshape(len(labels), -1) if len(labels) else features.reshape(0, 0)
+    if len(features) != len(labels):
+        raise ValueError(f"Dataset {prefix}: {len(features)} feature rows but {len(labels)} labels.")
+
+    matrix_path, labels_path = dataset_paths(prefix)
+    version = new_version()
+
+    with open(f"{matrix_path}.tmp", "wb") as f:
+        np.save(f, features)
+    os.replace(f"{matrix_path}.tmp", matrix_path)
+
+    with open(f"{labels_path}.tmp", "w") as f:
+        json.dump({
+            "format": DATASET_FORMAT,
+            "version": version,
+            "dtype": features.dtype.str,
+            "shape": list(features.shape),
+            "labels": list(labels),
+        }, f)
+    os.replace(f"{labels_path}.tmp", labels_path)
+
+    logging.info(f"💾 Saved dataset {prefix} v{version} ({features.shape[0]}×{features.shape[1]} {features.dtype})")
+    return version
+
+
+# ✅ Zero-Copy Load
+def load_dataset(prefix, mmap=True):
+    """
+    Opens the dataset under `prefix`, or returns None if it has not been written yet.
+    :raises ValueError: if the matrix does not match its label table (e.g. a torn write).
+    """
+    matrix_path, labels_path = dataset_paths(prefix)
+    if not (os.path.exists(matrix_path) and os.path.exists(labels_path)):
+        return None
+
+    with open(labels_path) as f:
+        meta = json.load(f)
+    if meta.get("format") != DATASET_FORMAT:
+        raise ValueError(f"Dataset {prefix}: unsupported format {meta.get('format')}.")
+
+    features = np.load(matrix_path, mmap_mode="r" if mmap else None)
+    if list(features.shape) != meta["shape"] or features.dtype.str != meta["dtype"] or len(meta["labels"]) != len(features):
+        raise ValueError(f"Dataset {prefix}: matrix {features.shape} {features.dtype} does not match its label table.")
+
+    return FaceDataset(features, meta["labels"], meta["version"])
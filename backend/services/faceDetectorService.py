@@ -0,0 +1,219 @@
+import os
+import logging
+import threading
+import cv2
+import dlib
+import numpy as np
+from backend.services.modelRegistryService import get_model
+
+# ✅ OpenCV DNN SSD (ResNet-10, 300×300 input, Caffe mean subtraction)
+SSD_INPUT_SIZE = (300, 300)
+SSD_MEAN = (104.0, 177.0, 123.0)
+SSD_CONFIDENCE = float(os.getenv("UNIVOTE_SSD_CONFIDENCE", "0.5"))
+
+# ✅ Resolution Limits
+#    Detection runs on a copy whose longest side is at most DETECTION_MAX_SIDE; boxes are
+#    mapped back so landmarks and embeddings still use the full-resolution pixels.
+#    Large JPEGs are decoded with cv2.IMREAD_REDUCED_* while staying above DECODE_MAX_SIDE.
+DETECTION_MAX_SIDE = int(os.getenv("UNIVOTE_DETECTION_MAX_SIDE", "640"))    # 0 → never downscale
+DECODE_MAX_SIDE = int(os.getenv("UNIVOTE_DECODE_MAX_SIDE", "1280"))
+REDUCED_DECODE = os.getenv("UNIVOTE_REDUCED_DECODE", "1") == "1"
+REDUCED_DECODE_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+}
+
+# ✅ Detector Policy per Call Site
+#    A comma-separated list is a cascade: backends run in order until one finds a face.
+#    ssd  → OpenCV DNN SSD (fast, bundled in backend/Model)
+#    hog  → dlib HOG + linear SVM (fast, frontal faces only)
+#    mmod → dlib CNN (slow on CPU, most robust)
+DETECTOR_POLICIES = {
+    "recognition": os.getenv("UNIVOTE_DETECTOR_RECOGNITION", "ssd,mmod"),
+    "liveness": os.getenv("UNIVOTE_DETECTOR_LIVENESS", "hog"),
+    "training": os.getenv("UNIVOTE_DETECTOR_TRAINING", "ssd,mmod"),
+}
+
+_ssd_lock = threading.Lock()
+
+
+# ✅ Backends (list of BGR images in, one list of dlib.rectangle per image out)
+def _as_bgr(image):
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image
+
+
+def _detect_ssd(images):
+    net = get_model("ssd")
+    images = [_as_bgr(image) for image in images]
+    blob = cv2.dnn.blobFromImages(images, 1.0, SSD_INPUT_SIZE, SSD_MEAN, swapRB=False, crop=False)
+
+    # cv2.dnn.Net is not safe to share across concurrent forward passes
+    with _ssd_lock:
+        net.setInput(blob)
+        detections = net.forward()[0, 0]
+
+    detections = detections[detections[:, 2] >= SSD_CONFIDENCE]
+    results = []
+    for i, image in enumerate(images):
+        height, width = image.shape[:2]
+        boxes = np.clip(detections[detections[:, 0] == i, 3:7], 0.0, 1.0) * np.array([width, height, width, height])
+        results.append([
+            dlib.rectangle(int(left), int(top), int(right), int(bottom))
+            for left, top, right, bottom in boxes
+            if right > left and bottom > top
+        ])
+    return results
+
+
+def _detect_hog(images):
+    detector = get_model("hog")
+    return [
+        list(detector(image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)))
+        for image in images
+    ]
+
+
+def _detect_mmod(images):
+    detector = get_model("mmod")
+    rgb_images = [
+        cv2.cvtColor(image, cv2.COLOR_GRAY2RGB if image.ndim == 2 else cv2.COLOR_BGR2RGB)
+        for image in images
+    ]
+
+    # dlib only batches images of identical size, so run one batch per shape
+    by_shape = {}
+    for i, image in enumerate(rgb_images):
+        by_shape.setdefault(image.shape, []).append(i)
+
+    results = [None] * len(images)
+    for indices in by_shape.values():
+        batch = [rgb_images[i] for i in indices]
+        for i, detections in zip(indices, detector(batch, 0, batch_size=len(batch))):
+            results[i] = [detection.rect for detection in detections]
+    return results
+
+
+BACKENDS = {
+    "ssd": _detect_ssd,
+    "hog": _detect_hog,
+    "mmod": _detect_mmod,
+}
+
+
+def parse_policy(policy):
+    """Turns "ssd,mmod" (or a list) into an ordered tuple of backend names."""
+    names = policy.split(",") if isinstance(policy, str) else policy
+    names = tuple(name.strip().lower() for name in names if name.strip())
+    unknown = [name for name in names if name not in BACKENDS]
+    if unknown or not names:
+        raise ValueError(f"Invalid face detector policy '{policy}'. Choose from {sorted(BACKENDS)}.")
+    return names
+
+
+# ✅ Read JPEG Dimensions From the SOF Header (no pixel decoding)
+def _jpeg_size(data):
+    if data[:2] != b"\xff\xd8":
+        return None
+    offset = 2
+    while offset + 9 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            offset += 2
+            continue
+        length = int.from_bytes(data[offset + 2:offset + 4], "big")
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height = int.from_bytes(data[offset + 5:offset + 7], "big")
+            width = int.from_bytes(data[offset + 7:offset + 9], "big")
+            return width, height
+        offset += 2 + length
+    return None
+
+
+# ✅ Decode Image Bytes, Shrinking Very Large JPEGs While Decoding
+def decode_image(image_bytes, max_side=DECODE_MAX_SIDE):
+    """
+    Decodes encoded image bytes into a BGR array (None if invalid).
+    JPEGs much larger than `max_side` are decoded at 1/2, 1/4 or 1/8 scale by libjpeg itself,
+    which is several times faster than a full decode followed by a resize.
+    """
+    data = bytes(image_bytes)
+    flag = cv2.IMREAD_COLOR
+
+    size = _jpeg_size(data) if REDUCED_DECODE and max_side else None
+    if size is not None:
+        for factor, reduced_flag in REDUCED_DECODE_FLAGS.items():
+            if max(size) // factor >= max_side:
+                flag = reduced_flag
+                break
+
+    return cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+
+
+def read_image(image_path, max_side=DECODE_MAX_SIDE):
+    """`cv2.imread` counterpart of `decode_image`."""
+    try:
+        with open(image_path, "rb") as f:
+            return decode_image(f.read(), max_side)
+    except OSError:
+        return None
+
+
+# ✅ Downscale for Detection, Then Map Boxes Back
+def _detection_scale(image, max_side):
+    longest = max(image.shape[:2])
+    return max_side / longest if max_side and longest > max_side else 1.0
+
+
+def _rescale(rect, scale, height, width):
+    return dlib.rectangle(
+        max(0, int(round(rect.left() / scale))),
+        max(0, int(round(rect.top() / scale))),
+        min(width - 1, int(round(rect.right() / scale))),
+        min(height - 1, int(round(rect.bottom() / scale))),
+    )
+
+
+# ✅ Detect Faces With a Cascade Policy
+def detect_faces_batch(images, site="recognition", policy=None, max_side=DETECTION_MAX_SIDE):
+    """
+    Batched `detect_faces`: each cascade stage runs once over every image still without a face.
+    :return: one list of dlib.rectangle per image, in that image's coordinates.
+    """
+    backends = parse_policy(policy if policy is not None else DETECTOR_POLICIES[site])
+
+    scales = [_detection_scale(image, max_side) for image in images]
+    small = [
+        cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else image
+        for image, scale in zip(images, scales)
+    ]
+
+    results = [[] for _ in images]
+    pending = list(range(len(images)))
+    for backend in backends:
+        if not pending:
+            break
+        for i, faces in zip(pending, BACKENDS[backend]([small[i] for i in pending])):
+            results[i] = faces
+        pending = [i for i in pending if not results[i]]
+        if pending:
+            logging.debug(f"🔍 '{backend}' detector found no face in {len(pending)} image(s), trying next backend")
+
+    for i, (image, scale) in enumerate(zip(images, scales)):
+        if scale < 1.0:
+            height, width = image.shape[:2]
+            results[i] = [_rescale(face, scale, height, width) for face in results[i]]
+    return results
+
+
+def detect_faces(image, site="recognition", policy=None, max_side=DETECTION_MAX_SIDE):
+    """
+    Detects faces in a BGR (or grayscale) image.
+    :param site: call site whose configured policy is used ("recognition", "liveness", "training").
+    :param policy: explicit backend or cascade (e.g. "hog" or "ssd,mmod"), overriding `site`.
+    :param max_side: longest side the detectors see; larger images are downscaled first.
+    :return: list of dlib.rectangle in `image` coordinates, usable with the landmark predictor.
+    """
+    return detect_faces_batch([image], site=site, policy=policy, max_side=max_side)[0]
@@ -0,0 +1,418 @@
+import os
+import json
+import time
+import base64
+import logging
+import functools
+import contextlib
+import threading
+import numpy as np
+
+try:
+    import fcntl  # Unix only; elsewhere gallery writes are only serialized within one process
+except ImportError:
+    fcntl = None
+
+# 📌 Paths
+VOTER_GALLERY_PATH = "backend/data/voter_gallery.npz"
+
+# ✅ Dlib ResNet descriptors are 128-D
+EMBEDDING_DIM = 128
+
+# ✅ Ensure necessary directories exist
+os.makedirs("backend/data", exist_ok=True)
+
+# ✅ Seconds between checks for gallery files rewritten by another process (0 → no watcher)
+GALLERY_RELOAD_INTERVAL = float(os.getenv("UNIVOTE_GALLERY_RELOAD_INTERVAL", "10"))
+
+# ✅ Enrollment appends to `<gallery>.log`; the gallery is rewritten whole once the log holds more
+#    records than this or than the gallery itself, so the rewrite cost stays amortized O(1) per face
+GALLERY_COMPACT_MIN_RECORDS = int(os.getenv("UNIVOTE_GALLERY_COMPACT_MIN_RECORDS", "1024"))
+
+
+def new_version():
+    """Sortable artifact version, e.g. 20261017T162220-1a2b3c."""
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{time.time_ns() & 0xFFFFFF:06x}"
+
+
+def read_version(path):
+    """Version stamped into a saved gallery, "legacy" for unversioned files, None if missing."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            return str(data["version"]) if "version" in data.files else "legacy"
+    except (OSError, ValueError):
+        return None
+
+
+def unique_tmp_path(path, suffix=".tmp"):
+    """Temporary sibling of `path` private to this process and thread, so concurrent writers never share one."""
+    return f"{path}.{os.getpid()}-{threading.get_ident()}{suffix}"
+
+
+# ✅ Cross-Process Write Lock (every API worker enrolls; appends and rewrites of one gallery take turns)
+_held_locks = threading.local()
+
+
+@contextlib.contextmanager
+def gallery_write_lock(path):
+    """Exclusive `flock` on `<path>.lock`; re-entering it on the same thread is a no-op."""
+    held = _held_locks.__dict__.setdefault("paths", set())
+    if path in held:
+        yield
+        return
+    with open(f"{path}.lock", "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)  # Released when the file is closed
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.discard(path)
+
+
+# ✅ Append Log (one JSON line per enrolled face, after a header naming the gallery version it extends)
+def log_path(path):
+    return f"{path}.log"
+
+
+def _log_header(version):
+    return (json.dumps({"version": version}) + "\n").encode()
+
+
+def _log_record(universityID, name, embedding):
+    embedding = np.asarray(embedding, dtype=np.float32).reshape(EMBEDDING_DIM)
+    record = {"id": universityID, "name": name, "embedding": base64.b64encode(embedding.tobytes()).decode()}
+    return (json.dumps(record) + "\n").encode()
+
+
+def reset_log(path, version):
+    """Atomically replaces the gallery's log with an empty one extending `version`; returns its size."""
+    header = _log_header(version)
+    tmp_path = unique_tmp_path(log_path(path))
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+    os.replace(tmp_path, log_path(path))
+    return len(header)
+
+
+def read_log(path, version, offset=0):
+    """
+    Faces appended to the log of gallery `path` after byte `offset`, as ([(universityID, name, embedding)], end).
+    Returns None if the log extends another gallery version. A torn last line (crash mid-append) is left unread.
+    """
+    try:
+        f = open(log_path(path), "rb")
+    except FileNotFoundError:
+        return [], offset
+    with f:
+        header = f.readline()
+        if not header.endswith(b"\n") or json.loads(header).get("version") != version:
+            return None
+        start = max(offset, len(header))
+        f.seek(start)
+        data = f.read()
+    complete = data[:data.rfind(b"\n") + 1]
+    records = []
+    for line in complete.splitlines():
+        record = json.loads(line)
+        records.append((record["id"], record["name"], np.frombuffer(base64.b64decode(record["embedding"]), dtype=np.float32)))
+    return records, start + len(complete)
+
+
+def read_revision(path):
+    """Gallery version plus the size of its append log; changes whenever either does (None if missing)."""
+    version = read_version(path)
+    if version is None:
+        return None
+    try:
+        appended = os.path.getsize(log_path(path))
+    except OSError:
+        appended = 0
+    return f"{version}+{appended}"
+
+
+# ✅ Galleries This Process Is Writing (the watcher leaves them alone until the write is done)
+_saving = {}  # path → number of writes in progress (they nest)
+_saving_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def saving(path):
+    with _saving_lock:
+        _saving[path] = _saving.get(path, 0) + 1
+    try:
+        yield
+    finally:
+        with _saving_lock:
+            _saving[path] -= 1
+            if not _saving[path]:
+                del _saving[path]
+
+
+def is_saving(path):
+    with _saving_lock:
+        return path in _saving
+
+
+class FaceGallery:
+    """
+    Enrolled face embeddings kept in one contiguous float32 matrix.
+    Row `i` of `embeddings` belongs to `ids[i]` / `names[i]`.
+    """
+
+    def __init__(self, ids=None, names=None, embeddings=None, version=None):
+        ids = list(ids) if ids is not None else []
+        names = list(names) if names is not None else [""] * len(ids)
+        if embeddings is None:
+            embeddings = np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        if len(ids) != len(embeddings) or len(names) != len(embeddings):
+            raise ValueError("Gallery ids, names and embeddings must have the same length.")
+
+        self._lock = threading.Lock()
+        self._log_lock = threading.RLock()  # Serializes appends, log replays and saves
+        self.version = version or new_version()
+        self.log_offset = 0   # Bytes of `<path>.log` applied so far
+        self.log_records = 0  # Faces applied from it
+        self._ids = ids
+        self._names = names
+        self._index = {universityID: row for row, universityID in enumerate(ids)}
+
+        # ✅ Over-allocate so enrollment appends in place instead of copying the matrix
+        self._size = len(embeddings)
+        self._buffer = np.empty((max(16, 2 * self._size), EMBEDDING_DIM), dtype=np.float32)
+        self._buffer[:self._size] = embeddings
+        self._sq_norms = np.empty(len(self._buffer), dtype=np.float32)
+        self._sq_norms[:self._size] = np.einsum("ij,ij->i", embeddings, embeddings)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def revision(self):
+        """Compared by the watcher with `read_revision(path)`."""
+        return f"{self.version}+{self.log_offset}"
+
+    @property
+    def needs_compaction(self):
+        return self.log_records > max(GALLERY_COMPACT_MIN_RECORDS, self._size)
+
+    @property
+    def ids(self):
+        return self._ids
+
+    @property
+    def names(self):
+        return self._names
+
+    @property
+    def embeddings(self):
+        """View of the enrolled rows (no copy)."""
+        return self._buffer[:self._size]
+
+    @property
+    def sq_norms(self):
+        """Squared L2 norm of every enrolled row, kept in sync with `embeddings`."""
+        return self._sq_norms[:self._size]
+
+    def row_of(self, universityID):
+        return self._index.get(universityID)
+
+    def snapshot(self):
+        """Consistent (embeddings, sq_norms, ids, names) views for readers racing with `add`."""
+        with self._lock:
+            size = self._size
+            return self._buffer[:size], self._sq_norms[:size], self._ids, self._names
+
+    # ✅ Add or Replace One Identity
+    def add(self, universityID, name, embedding):
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(EMBEDDING_DIM)
+
+        with self._lock:
+            row = self._index.get(universityID)
+            if row is not None:
+                self._buffer[row] = embedding
+                self._sq_norms[row] = embedding @ embedding
+                self._names[row] = name
+                return row
+
+            if self._size == len(self._buffer):
+                grown = np.empty((2 * len(self._buffer), EMBEDDING_DIM), dtype=np.float32)
+                grown[:self._size] = self._buffer[:self._size]
+                self._buffer = grown
+                grown_norms = np.empty(len(grown), dtype=np.float32)
+                grown_norms[:self._size] = self._sq_norms[:self._size]
+                self._sq_norms = grown_norms
+
+            row = self._size
+            self._buffer[row] = embedding
+            self._sq_norms[row] = embedding @ embedding
+            self._ids.append(universityID)
+            self._names.append(name)
+            self._index[universityID] = row
+            self._size += 1
+            return row
+
+    # ✅ Persistence
+    @contextlib.contextmanager
+    def writing(self, path):
+        """Held around every write of `path`: this gallery's log lock, the cross-process file lock and the watcher's skip flag."""
+        with self._log_lock, gallery_write_lock(path), saving(path):
+            yield
+
+    def save(self, path=VOTER_GALLERY_PATH, version=None):
+        """
+        Writes the whole gallery under `version` (a new one by default) to a temporary file, renames it
+        into place and starts an empty append log for it. `self.version` only changes once the file is
+        live, so it never names a version that is not on disk yet.
+        """
+        version = version or new_version()
+        tmp_path = unique_tmp_path(path, ".tmp.npz")
+        with self.writing(path):
+            with self._lock:
+                np.savez(
+                    tmp_path,
+                    ids=np.array(self._ids, dtype=str),
+                    names=np.array(self._names, dtype=str),
+                    embeddings=self.embeddings,
+                    version=np.array(version),
+                )
+            os.replace(tmp_path, path)
+            # Until the log is replaced its header still names the old version, so nobody replays it twice
+            self.log_offset = reset_log(path, version)
+            self.version = version
+            self.log_records = 0
+        logging.info(f"💾 Saved face gallery v{self.version} ({self._size} faces) to {path}")
+
+    # ✅ Incremental Persistence (O(batch) on disk instead of rewriting every enrolled face)
+    def append(self, path, entries, add=None):
+        """
+        Adds (universityID, name, embedding) entries through `add` (default: `self.add`) and appends them
+        to the gallery's log, after first applying whatever other workers appended. The first append to a
+        gallery that was never saved writes it whole.
+        :return: False (nothing added) if another process rewrote `path`; reload it and retry.
+        """
+        add = add or self.add
+        with self.writing(path):
+            if not os.path.exists(path):
+                for universityID, name, embedding in entries:
+                    add(universityID, name, embedding)
+                self.save(path)
+                return True
+
+            if read_version(path) != self.version:
+                return False
+            if not self.catch_up(path, add) or not os.path.exists(log_path(path)):
+                # No log yet, or a crash left the previous version's log behind (already folded into `path`)
+                self.log_offset = reset_log(path, self.version)
+            with open(log_path(path), "r+b") as f:
+                for universityID, name, embedding in entries:
+                    add(universityID, name, embedding)
+                f.truncate(self.log_offset)  # Drops a torn line left by a crash mid-append
+                f.seek(self.log_offset)
+                f.write(b"".join(_log_record(*entry) for entry in entries))
+                f.flush()
+                os.fsync(f.fileno())
+                self.log_offset = f.tell()
+            self.log_records += len(entries)
+            return True
+
+    def catch_up(self, path, add=None):
+        """
+        Applies faces appended to the log since the last call (by any process) through `add`.
+        :return: False if `path` now holds another version; reload it instead.
+        """
+        with self._log_lock:
+            if read_version(path) != self.version:
+                return False
+            found = read_log(path, self.version, self.log_offset)
+            if found is None:
+                return False
+            records, end = found
+            for universityID, name, embedding in records:
+                (add or self.add)(universityID, name, embedding)
+            self.log_offset = end
+            self.log_records += len(records)
+            return True
+
+    @classmethod
+    def load(cls, path=VOTER_GALLERY_PATH):
+        """Loads a gallery and replays its append log, or returns None if it has not been built yet."""
+        if not os.path.exists(path):
+            return None
+
+        with np.load(path) as data:
+            gallery = cls(
+                ids=data["ids"].tolist(),
+                names=data["names"].tolist(),
+                embeddings=data["embeddings"],
+                version=str(data["version"]) if "version" in data.files else "legacy",
+            )
+        gallery.catch_up(path)
+        logging.info(f"✅ Loaded face gallery v{gallery.version} ({len(gallery)} faces, {gallery.log_records} appended) from {path}")
+        return gallery
+
+
+def reports_version(current_matcher):
+    """
+    Decorator that captures the live matcher before the call, hands it to `fn` as `matcher=` and stamps
+    its gallery version as `model_version` into the result dict, so a hot swap mid-call cannot mislabel it.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            matcher = current_matcher()
+            result = fn(*args, matcher=matcher, **kwargs)
+            if isinstance(result, dict):
+                result["model_version"] = matcher.gallery.version if matcher is not None else None
+            return result
+        return wrapper
+    return decorator
+
+
+class GalleryWatcher:
+    """
+    Polls saved gallery files and calls `reload()` for each one whose revision changed on disk,
+    so faces enrolled by another worker, or galleries rewritten by a training script, go live without a restart.
+    """
+
+    def __init__(self, interval=GALLERY_RELOAD_INTERVAL):
+        self.interval = interval
+        self._targets = []
+        self._thread = None
+        self._stop = threading.Event()
+
+    def watch(self, path, current_revision, reload):
+        """`current_revision()` reports the live gallery's `revision`; `reload()` catches up or swaps in the new one."""
+        self._targets.append((path, current_revision, reload))
+
+    def check(self):
+        for path, current_revision, reload in self._targets:
+            if is_saving(path):
+                continue  # Our own write; the saving gallery adopts the new revision itself
+            on_disk = read_revision(path)
+            if on_disk is not None and on_disk != current_revision():
+                logging.info(f"🔄 {path} changed on disk (v{on_disk}), reloading...")
+                try:
+                    reload()
+                except Exception as e:
+                    logging.error(f"❌ Hot reload of {path} failed, keeping the current version: {str(e)}")
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="gallery-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+
+gallery_watcher = GalleryWatcher()
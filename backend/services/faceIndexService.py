@@ -0,0 +1,254 @@
+import os
+import logging
+import threading
+from array import array
+import numpy as np
+from backend.services.faceGalleryService import EMBEDDING_DIM, unique_tmp_path
+
+# ✅ Index Backend & Recall/Latency Knobs
+#    exact → brute-force scan of the whole gallery (default, best for small electorates)
+#    ivf   → inverted-file index: only `nprobe` of `nlist` k-means cells are scanned per query
+FACE_INDEX_BACKEND = os.getenv("UNIVOTE_FACE_INDEX", "exact")
+IVF_NLIST = int(os.getenv("UNIVOTE_IVF_NLIST", "0"))        # 0 → 4·√N cells, chosen at train time
+IVF_NPROBE = int(os.getenv("UNIVOTE_IVF_NPROBE", "16"))     # cells scanned per query (↑ recall, ↑ latency)
+IVF_RERANK = int(os.getenv("UNIVOTE_IVF_RERANK", "32"))     # coarse candidates re-scored exactly
+IVF_KMEANS_ITERATIONS = 10
+IVF_TRAIN_SAMPLE_PER_CELL = 64
+
+# ✅ Distances are computed in chunks of this many rows to bound memory
+DISTANCE_CHUNK_ROWS = 8192
+
+
+def squared_distances(queries, embeddings, sq_norms=None):
+    """(m, n) squared Euclidean distances via ||q||² + ||g||² - 2·q·g."""
+    if sq_norms is None:
+        sq_norms = np.einsum("ij,ij->i", embeddings, embeddings)
+    sq_dist = sq_norms[None, :] - 2.0 * (queries @ embeddings.T)
+    sq_dist += np.einsum("ij,ij->i", queries, queries)[:, None]
+    return np.maximum(sq_dist, 0.0)
+
+
+def top_k(sq_dist, k):
+    """Column indices of the `k` smallest values per row, sorted ascending."""
+    k = min(k, sq_dist.shape[1])
+    if k < sq_dist.shape[1]:
+        cols = np.argpartition(sq_dist, k - 1, axis=1)[:, :k]
+    else:
+        cols = np.tile(np.arange(sq_dist.shape[1]), (sq_dist.shape[0], 1))
+    order = np.argsort(np.take_along_axis(sq_dist, cols, axis=1), axis=1)
+    return np.take_along_axis(cols, order, axis=1)
+
+
+class ExactIndex:
+    """Brute-force scan over every gallery row. Needs no training or persistence."""
+
+    name = "exact"
+
+    def __init__(self, gallery):
+        self.gallery = gallery
+
+    def add(self, row, embedding):
+        pass
+
+    def search(self, queries, k):
+        embeddings, sq_norms, _, _ = self.gallery.snapshot()
+        if len(embeddings) == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.float32), empty.astype(np.int64)
+
+        sq_dist = squared_distances(queries, embeddings, sq_norms)
+        rows = top_k(sq_dist, k)
+        return np.sqrt(np.take_along_axis(sq_dist, rows, axis=1)), rows
+
+    def save(self, path, gallery_version=None):
+        pass
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate index over a FaceGallery.
+    Gallery rows are bucketed by their nearest k-means centroid. A query scans only the
+    `nprobe` closest buckets, keeps the best `rerank` candidates and re-scores those exactly
+    (direct float64 differences, free of the cancellation error of the expanded form).
+    New rows are appended to their bucket without retraining.
+    """
+
+    name = "ivf"
+
+    def __init__(self, gallery, nlist=IVF_NLIST, nprobe=IVF_NPROBE, rerank=IVF_RERANK):
+        self.gallery = gallery
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.centroids = None
+        self.trained_on = 0
+        self._lists = []
+        self._cell_of = array("q")
+        self._indexed = 0
+        self._lock = threading.Lock()
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    @property
+    def needs_retrain(self):
+        """True once the gallery has outgrown the centroids it was trained on."""
+        return not self.is_trained or len(self.gallery) > 4 * max(self.trained_on, 1)
+
+    # ✅ Coarse Quantizer (k-means over a sample of the gallery)
+    def train(self):
+        embeddings, _, _, _ = self.gallery.snapshot()
+        nlist = self.nlist or max(1, int(4 * np.sqrt(len(embeddings))))
+        nlist = min(nlist, len(embeddings))
+        if nlist == 0:
+            logging.warning("⚠️ Cannot train IVF index on an empty gallery.")
+            return
+
+        rng = np.random.default_rng(0)
+        sample_size = min(len(embeddings), nlist * IVF_TRAIN_SAMPLE_PER_CELL)
+        sample = embeddings[rng.choice(len(embeddings), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(IVF_KMEANS_ITERATIONS):
+            assignment = self._assign(sample, centroids)
+            order = np.argsort(assignment, kind="stable")
+            filled, starts, counts = np.unique(assignment[order], return_index=True, return_counts=True)
+            centroids[filled] = np.add.reduceat(sample[order], starts, axis=0) / counts[:, None]
+
+        with self._lock:
+            self.centroids = centroids.astype(np.float32)
+            self.trained_on = len(embeddings)
+            self._lists = [array("q") for _ in range(nlist)]
+            self._cell_of = array("q")
+            self._indexed = 0
+        self._index_pending()
+        logging.info(f"✅ IVF index trained: {nlist} cells over {len(embeddings)} faces.")
+
+    def _assign(self, vectors, centroids):
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), DISTANCE_CHUNK_ROWS):
+            chunk = vectors[start:start + DISTANCE_CHUNK_ROWS]
+            assignment[start:start + len(chunk)] = np.argmin(squared_distances(chunk, centroids), axis=1)
+        return assignment
+
+    def _index_pending(self):
+        """Buckets gallery rows that were appended since the last call."""
+        embeddings, _, _, _ = self.gallery.snapshot()
+        with self._lock:
+            pending = embeddings[self._indexed:]
+            if len(pending) == 0:
+                return
+            for offset, cell in enumerate(self._assign(pending, self.centroids)):
+                self._lists[cell].append(self._indexed + offset)
+                self._cell_of.append(cell)
+            self._indexed += len(pending)
+
+    # ✅ Incremental Insert
+    def add(self, row, embedding):
+        if self.needs_retrain:
+            # Cells are re-learned only when the gallery quadruples, so the cost stays amortized
+            self.train()
+            return
+        with self._lock:
+            if row < self._indexed:
+                # Re-enrollment overwrote an existing row: move it to its new cell
+                self._lists[self._cell_of[row]].remove(row)
+                cell = int(self._assign(np.asarray(embedding, dtype=np.float32).reshape(1, -1), self.centroids)[0])
+                self._lists[cell].append(row)
+                self._cell_of[row] = cell
+                return
+        self._index_pending()
+
+    # ✅ Approximate Search With Exact Re-Ranking
+    def search(self, queries, k):
+        if not self.is_trained:
+            # Untrained (tiny gallery): an exact scan is both correct and cheap enough
+            return ExactIndex(self.gallery).search(queries, k)
+        self._index_pending()
+        embeddings, _, _, _ = self.gallery.snapshot()
+
+        k = min(k, len(embeddings))
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+
+        cell_dist = squared_distances(queries, self.centroids)
+        probes = top_k(cell_dist, self.nprobe)
+
+        for q, query in enumerate(queries):
+            with self._lock:
+                candidates = np.concatenate([np.array(self._lists[cell], dtype=np.int64) for cell in probes[q]])
+            if len(candidates) == 0:
+                continue
+
+            coarse = squared_distances(query[None, :], embeddings[candidates])[0]
+            keep = candidates[top_k(coarse[None, :], max(k, self.rerank))[0]]
+
+            exact = np.linalg.norm(embeddings[keep].astype(np.float64) - query.astype(np.float64), axis=1)
+            order = np.argsort(exact)[:k]
+            distances[q, :len(order)] = exact[order]
+            rows[q, :len(order)] = keep[order]
+
+        return distances, rows
+
+    # ✅ Persistence (stamped with the gallery version and row count it describes)
+    def save(self, path, gallery_version=None):
+        """`gallery_version` stamps the version the gallery is about to be published under (default: its current one)."""
+        if not self.is_trained:
+            return
+        with self._lock:
+            tmp_path = unique_tmp_path(path, ".tmp.npz")
+            np.savez(tmp_path, centroids=self.centroids, trained_on=self.trained_on,
+                     assignment=np.array(self._cell_of, dtype=np.int64),
+                     gallery_version=np.array(gallery_version or self.gallery.version), rows=self._indexed)
+        os.replace(tmp_path, path)
+        logging.info(f"💾 Saved IVF index ({len(self.centroids)} cells, {self._indexed} faces) to {path}")
+
+    @classmethod
+    def load(cls, gallery, path):
+        """
+        Restores a trained index, then buckets any gallery rows enrolled after it was saved.
+        An index saved for another gallery version (or more rows than the gallery has) is retrained.
+        """
+        index = cls(gallery)
+        stale = None
+        if os.path.exists(path):
+            with np.load(path) as data:
+                saved_version = str(data["gallery_version"]) if "gallery_version" in data.files else None
+                saved_rows = int(data["rows"]) if "rows" in data.files else None
+                if saved_version != gallery.version or saved_rows is None or saved_rows > len(gallery):
+                    stale = f"saved for gallery v{saved_version} ({saved_rows} faces)"
+                else:
+                    index.centroids = data["centroids"]
+                    index.trained_on = int(data["trained_on"])
+                    assignment = data["assignment"][:saved_rows]
+            if stale is None:
+                index._lists = [array("q") for _ in range(len(index.centroids))]
+                for row, cell in enumerate(assignment.tolist()):
+                    index._lists[cell].append(row)
+                index._cell_of = array("q", assignment.tolist())
+                index._indexed = len(assignment)
+                index._index_pending()
+                logging.info(f"✅ Loaded IVF index ({len(index.centroids)} cells) from {path}")
+                return index
+            logging.info(f"🔄 {path} was {stale}, not v{gallery.version} ({len(gallery)} faces); retraining...")
+        if len(gallery) > 0:
+            index.train()
+            index.save(path)
+        return index
+
+
+def create_index(gallery, path=None, backend=FACE_INDEX_BACKEND, rebuild=False):
+    """Builds the configured index over `gallery`, restoring it from `path` unless `rebuild` is set."""
+    if backend == "ivf":
+        if rebuild:
+            index = IVFIndex(gallery)
+            if len(gallery) > 0:
+                index.train()
+                if path:
+                    index.save(path)
+            return index
+        return IVFIndex.load(gallery, path) if path else IVFIndex(gallery)
+    if backend != "exact":
+        logging.warning(f"⚠️ Unknown face index backend '{backend}', using exact search.")
+    return ExactIndex(gallery)
@@ -0,0 +1,79 @@
+import logging
+import numpy as np
+from backend.services.faceGalleryService import FaceGallery, EMBEDDING_DIM
+from backend.services.faceIndexService import ExactIndex
+
+# ✅ Dlib's calibrated same-person threshold on raw 128-D descriptors
+MATCH_DISTANCE_THRESHOLD = 0.6
+
+
+class FaceMatcher:
+    """
+    Nearest-neighbour search over a FaceGallery.
+    Queries go through a pluggable index (exact scan by default, see faceIndexService);
+    returned distances are plain Euclidean distances between dlib descriptors.
+    """
+
+    def __init__(self, gallery=None, index=None):
+        self.gallery = gallery if gallery is not None else FaceGallery()
+        self.index = index if index is not None else ExactIndex(self.gallery)
+
+    def __len__(self):
+        return len(self.gallery)
+
+    # ✅ Enroll One Face Into Gallery & Index
+    def add(self, universityID, name, embedding):
+        row = self.gallery.add(universityID, name, embedding)
+        self.index.add(row, embedding)
+        return row
+
+    # ✅ Batched Top-K Search
+    def search(self, queries, k=1):
+        """
+        :param queries: (m, 128) or (128,) array of embeddings.
+        :return: (distances, rows), both shaped (m, k') with k' = min(k, gallery size),
+                 sorted by ascending distance. Rows index the gallery's `ids` / `names`.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        return self.index.search(queries, k)
+
+    # ✅ 1:1 Distance to One Enrolled Identity
+    def distance_to(self, universityID, queries):
+        """
+        Smallest Euclidean distance between `queries` and the template enrolled for `universityID`.
+        Touches a single gallery row, so the cost does not grow with the electorate.
+        :return: float distance, or None if `universityID` has no enrolled template.
+        """
+        row = self.gallery.row_of(universityID)
+        if row is None:
+            return None
+        embeddings, _, _, _ = self.gallery.snapshot()
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        return float(np.min(np.linalg.norm(queries - embeddings[row], axis=1)))
+
+    # ✅ Best Match for a Single Face
+    def match(self, embedding, threshold=MATCH_DISTANCE_THRESHOLD):
+        """Returns {"universityID", "name", "distance"} for the closest face within `threshold`, else None."""
+        distances, rows = self.search(embedding, k=1)
+        if distances.shape[1] == 0:
+            return None
+
+        distance = float(distances[0, 0])
+        if distance >= threshold:
+            logging.info(f"📏 Closest face at distance {distance:.3f} exceeds threshold {threshold}")
+            return None
+
+        row = int(rows[0, 0])
+        return {
+            "universityID": self.gallery.ids[row],
+            "name": self.gallery.names[row],
+            "distance": distance,
+        }
+
+
+# ✅ Split a Legacy "First Last (ID)" Label Into (ID, Name)
+def parse_label(label):
+    parts = label.split()
+    if len(parts) > 1 and parts[-1].startswith("(") and parts[-1].endswith(")"):
+        return parts[-1][1:-1], " ".join(parts[:-1])
+    return label, label
@@ -6,18 +6,20 @@ import pickle
 import sqlite3
 import base64
 import logging
+import threading
 from scipy.spatial import distance
 from skimage.metrics import structural_similarity as ssim
-from sklearn.preprocessing import StandardScaler
-from sklearn.neighbors import KNeighborsClassifier
+from backend.services.faceGalleryService import FaceGallery, VOTER_GALLERY_PATH, gallery_watcher, reports_version, new_version
+from backend.services.faceMatcherService import FaceMatcher, MATCH_DISTANCE_THRESHOLD
+from backend.services.faceIndexService import create_index
+from backend.services.faceDetectorService import decode_image, read_image
+from backend.services.faceAnalysisService import FaceAnalysis, as_face_analysis
+from backend.services.embeddingCacheService import embed_image_bytes
+from backend.services.databaseService import get_connection
 
 # 📌 Paths
 DATABASE_PATH = "backend/data/voters.db"
-KNN_MODEL_PATH = "backend/data/knn_voter.pkl"
-SCALER_PATH = "backend/data/scaler_voter.pkl"
-CNN_MODEL_PATH = "backend/models/mmod_human_face_detector.dat"
-FACE_REC_MODEL_PATH = "backend/models/dlib_face_recognition_resnet_model_v1.dat"
-PREDICTOR_PATH = "backend/models/shape_predictor_68_face_landmarks.dat"
+VOTER_INDEX_PATH = "backend/data/voter_index.npz"
 LOG_FILE = "backend/logs/face_recognition.log"
 
 DATABASE_DIR = "backend/data/face_embeddings"
@@ -29,175 +31,285 @@ os.makedirs("backend/logs", exist_ok=True)
 # ✅ Setup Logging
 logging.basicConfig(filename=LOG_FILE, level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-# ✅ Load Dlib Models
-if not os.path.exists(CNN_MODEL_PATH):
-    raise FileNotFoundError("⚠️ CNN model missing! Download from http://dlib.net/files/mmod_human_face_detector.dat.bz2")
-cnn_detector = dlib.cnn_face_detection_model_v1(CNN_MODEL_PATH)
-
-if not os.path.exists(FACE_REC_MODEL_PATH):
-    raise FileNotFoundError("⚠️ Face Recognition Model missing! Download from http://dlib.net/files/dlib_face_recognition_resnet_model_v1.dat.bz2")
-face_recognizer = dlib.face_recognition_model_v1(FACE_REC_MODEL_PATH)
-
-if not os.path.exists(PREDICTOR_PATH):
-    raise FileNotFoundError("⚠️ Shape Predictor missing! Download from http://dlib.net/files/shape_predictor_68_face_landmarks.dat.bz2")
-landmark_predictor = dlib.shape_predictor(PREDICTOR_PATH)
-
-# ✅ Load KNN Model & Scaler
-knn, scaler = None, None
-if os.path.exists(KNN_MODEL_PATH) and os.path.exists(SCALER_PATH):
-    with open(KNN_MODEL_PATH, "rb") as f:
-        knn = pickle.load(f)
-    with open(SCALER_PATH, "rb") as f:
-        scaler = pickle.load(f)
-else:
-    logging.warning("⚠️ KNN model not found! Please train the model before running face recognition.")
+# ✅ Precomputed Voter Embedding Gallery (built lazily on first use if missing)
+voter_gallery = FaceGallery.load(VOTER_GALLERY_PATH)
+voter_matcher = None
+if voter_gallery is not None:
+    voter_matcher = FaceMatcher(voter_gallery, create_index(voter_gallery, VOTER_INDEX_PATH))
+gallery_lock = threading.Lock()
+
+def voter_model_version():
+    """Version of the voter gallery currently serving requests (None until one exists)."""
+    matcher = voter_matcher
+    return matcher.gallery.version if matcher is not None else None
+
+def voter_gallery_revision():
+    """Revision of the voter gallery currently serving requests (None until one exists)."""
+    matcher = voter_matcher
+    return matcher.gallery.revision if matcher is not None else None
 
 # ✅ Check for Blurry Images Before Recognition
 def is_blurry(image, threshold=50):
-    """Detects blur in an image using the Laplacian variance method."""
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    variance = cv2.Laplacian(gray, cv2.CV_64F).var()
-    return variance < threshold
-
-# ✅ Preprocess Face
-def preprocess_face(image):
-    """Prepares a face image for recognition."""
-    image = cv2.resize(image, (100, 100))
-    image = image.astype("float32") / 255.0  # Normalize
-    return image.flatten().reshape(1, -1)
+    """Detects blur in an image (or FaceAnalysis) using the Laplacian variance method."""
+    return as_face_analysis(image).is_blurry(threshold)
 
 def recognize_face_from_file(image_path):
     """🎭 Recognizes face from an image file instead of Base64."""
 
     # ✅ Load image from file
-    image = cv2.imread(image_path)
+    image = read_image(image_path)
 
     if image is None:
         print(f"⚠️ Error loading image: {image_path}")
         return None
 
-    # ✅ Convert image to RGB (Dlib expects RGB)
-    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-
-    # ✅ Detect face using Dlib
-    faces_detected = cnn_detector(rgb_image)
+    # ✅ Detect, landmark and embed once
+    analysis = FaceAnalysis(image)
 
-    if len(faces_detected) == 0:
+    if len(analysis.faces) == 0:
         print("⚠️ No face detected.")
         return None
 
-    face_rect = faces_detected[0].rect
-    shape = landmark_predictor(rgb_image, face_rect)
-    face_embedding = np.array(face_recognizer.compute_face_descriptor(rgb_image, shape))
+    face_embedding = analysis.embedding(0)
 
     # ✅ Compare with database
     recognized_user = compare_face_embedding(face_embedding)
 
     return recognized_user 
 
-# ✅ Recognize Face (With CNN Detection & KNN)
-def recognize_face(image_array):
-    """Recognizes a face using the trained KNN model with Dlib's CNN face detector."""
-    if knn is None:
-        return {"status": "error", "message": "Face recognition unavailable. Train the model first."}
-    
+# ✅ Recognize Face (With CNN Detection & Gallery Matching)
+@reports_version(lambda: live_voter_matcher())
+def recognize_face(image_array, matcher=None):
+    """Recognizes a face by matching its dlib embedding against the voter gallery.
+    Accepts a BGR image or a FaceAnalysis already shared with other stages."""
     try:
-        if is_blurry(image_array):
+        analysis = as_face_analysis(image_array)
+        if analysis.is_blurry():
             return {"status": "error", "message": "Image is too blurry for recognition. Use a clearer image."}
 
-        rgb_image = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
-        faces = cnn_detector(rgb_image)
-
-        if len(faces) == 0:
+        if len(analysis.faces) == 0:
             return {"status": "error", "message": "No face detected"}
 
-        for face in faces:
-            shape = landmark_predictor(rgb_image, face.rect)
-            face_embedding = np.array(face_recognizer.compute_face_descriptor(rgb_image, shape))
+        if matcher is None or len(matcher) == 0:
+            return {"status": "error", "message": "Face recognition unavailable. No voters enrolled."}
 
-            processed_face = preprocess_face(face_embedding)
-            processed_face = scaler.transform(processed_face)
+        # ✅ Embed every detected face and query the gallery in one batch
+        distances, rows = matcher.search(analysis.embeddings, k=1)
 
-            # ✅ Predict Using KNN
-            distances, indices = knn.kneighbors(processed_face, n_neighbors=1)
-            recognized_user = knn.predict(processed_face)[0]
-            confidence = 1 - (distances[0][0] / np.max(distances))
+        best = int(np.argmin(distances[:, 0]))
+        distance = float(distances[best, 0])
+        row = int(rows[best, 0])
 
-            if confidence < 0.6:
-                return fallback_face_recognition(image_array)
+        if distance >= MATCH_DISTANCE_THRESHOLD:
+            logging.info(f"📏 No voter within threshold (closest distance {distance:.3f})")
+            return {"status": "error", "message": "No similar face found"}
 
-            return {
-                "status": "success",
-                "recognized_user": {
-                    "universityID": recognized_user.split()[-1][1:-1],
-                    "name": " ".join(recognized_user.split()[:-1]),
-                    "confidence": round(confidence, 2)
-                }
+        return {
+            "status": "success",
+            "recognized_user": {
+                "universityID": matcher.gallery.ids[row],
+                "name": matcher.gallery.names[row],
+                "confidence": round(1 - distance, 2),
+                "distance": round(distance, 4)
             }
-
-        return {"status": "error", "message": "Face recognition failed"}
+        }
 
     except Exception as e:
         return {"status": "error", "message": f"Face recognition error: {str(e)}"}
 
-# ✅ Fallback Face Recognition (If KNN Fails)
-def fallback_face_recognition(image_array):
-    """Fallback method using Dlib Face Embeddings for face comparison."""
+# ✅ Build the Voter Gallery From `voters.db` (one-off backfill)
+def build_voter_gallery():
+    """Embeds every stored voter image once into a new (not yet published) gallery."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT voters.universityID, voters.firstname, voters.lastname, face_images.image FROM voters
+        JOIN face_images ON face_images.hash = voters.image_hash
+    """)
+    voter_data = cursor.fetchall()
+
+    # ✅ Only photos never embedded before (under the current models) are decoded and embedded
+    ids, names, embeddings = [], [], []
+    cached = embed_image_bytes([image_blob for _, _, _, image_blob in voter_data])
+    for (universityID, firstname, lastname, _), embedding in zip(voter_data, cached):
+        if embedding is None:
+            logging.warning(f"⚠️ No usable face for voter {universityID}. Skipping...")
+            continue
+
+        ids.append(universityID)
+        names.append(f"{firstname} {lastname}")
+        embeddings.append(embedding)
+
+    gallery = FaceGallery(ids, names, np.array(embeddings, dtype=np.float32))
+    logging.info(f"✅ Voter gallery built with {len(gallery)} embeddings.")
+    return gallery
+
+def publish_voter_matcher(matcher, version=None):
+    """
+    Saves the index, then the gallery it describes, both stamped with `version` (default: the gallery's
+    own, for a freshly built one), so no reader ever loads a gallery whose index is not on disk yet.
+    Other workers' appends wait on the gallery's write lock meanwhile.
+    """
+    version = version or matcher.gallery.version
+    with matcher.gallery.writing(VOTER_GALLERY_PATH):
+        matcher.index.save(VOTER_INDEX_PATH, gallery_version=version)
+        matcher.gallery.save(VOTER_GALLERY_PATH, version=version)
+
+def get_voter_matcher():
+    """Returns the matcher over the voter gallery, building the gallery the first time."""
+    global voter_gallery, voter_matcher
+
+    if voter_matcher is None:
+        with gallery_lock:
+            if voter_matcher is None:
+                gallery = build_voter_gallery()
+                matcher = FaceMatcher(gallery, create_index(gallery, rebuild=True))
+                publish_voter_matcher(matcher)
+                voter_gallery, voter_matcher = gallery, matcher
+    return voter_matcher
+
+def live_voter_matcher():
+    """`get_voter_matcher()`, or None if the gallery cannot be built right now (logged)."""
     try:
-        rgb_image = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
-        faces = cnn_detector(rgb_image)
-
-        if len(faces) == 0:
-            return {"status": "error", "message": "No face detected"}
-
-        for face in faces:
-            shape = landmark_predictor(rgb_image, face.rect)
-            face_embedding = np.array(face_recognizer.compute_face_descriptor(rgb_image, shape))
-
-            # ✅ Retrieve stored voter embeddings from the database
-            conn = sqlite3.connect(DATABASE_PATH)
-            cursor = conn.cursor()
-            cursor.execute("SELECT universityID, image FROM voters WHERE image IS NOT NULL")
-            voter_data = cursor.fetchall()
-            conn.close()
-
-            best_match = None
-            best_distance = float("inf")
-
-            for universityID, image_blob in voter_data:
-                np_arr = np.frombuffer(image_blob, np.uint8)
-                stored_image = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-                stored_faces = cnn_detector(stored_image)
-
-                if len(stored_faces) == 0:
-                    continue
-
-                stored_shape = landmark_predictor(stored_image, stored_faces[0].rect)
-                stored_embedding = np.array(face_recognizer.compute_face_descriptor(stored_image, stored_shape))
+        return get_voter_matcher()
+    except Exception as e:
+        logging.error(f"❌ Voter gallery unavailable: {str(e)}")
+        return None
 
-                # ✅ Compute Euclidean distance
-                dist = np.linalg.norm(face_embedding - stored_embedding)
+# ✅ Full Rebuild (on demand only — registration enrolls incrementally)
+def rebuild_voter_gallery():
+    """Re-embeds every voter in `voters.db` and swaps in a freshly trained gallery and index."""
+    global voter_gallery, voter_matcher
+
+    gallery = build_voter_gallery()
+    matcher = FaceMatcher(gallery, create_index(gallery, rebuild=True))
+    publish_voter_matcher(matcher)
+    with gallery_lock:
+        voter_gallery, voter_matcher = gallery, matcher
+    return {"status": "success", "message": f"Voter gallery rebuilt with {len(gallery)} faces."}
+
+# ✅ Hot Reload of a Gallery Saved by Another Process
+def reload_voter_gallery():
+    """
+    Applies faces other workers appended to the live gallery; if the file was rewritten instead,
+    loads the gallery and index off to the side, then swaps them in with one assignment.
+    """
+    global voter_gallery, voter_matcher
+
+    matcher = voter_matcher
+    if matcher is not None and matcher.gallery.catch_up(VOTER_GALLERY_PATH, add=matcher.add):
+        return {"status": "success", "message": f"Voter gallery caught up ({len(matcher)} faces).", "model_version": matcher.gallery.version}
+
+    gallery = FaceGallery.load(VOTER_GALLERY_PATH)
+    if gallery is None:
+        return {"status": "error", "message": "No saved voter gallery to load."}
+
+    matcher = FaceMatcher(gallery, create_index(gallery, VOTER_INDEX_PATH))
+    with gallery_lock:
+        voter_gallery, voter_matcher = gallery, matcher
+    logging.info(f"✅ Voter gallery v{gallery.version} is now live.")
+    return {"status": "success", "message": f"Voter gallery reloaded with {len(gallery)} faces.", "model_version": gallery.version}
+
+gallery_watcher.watch(VOTER_GALLERY_PATH, voter_gallery_revision, reload_voter_gallery)
+
+# ✅ Enroll Newly Registered Voters Into the Gallery
+def enroll_voter_faces(entries):
+    """
+    Embeds a batch of registration photos in one pass and appends them to the persisted gallery.
+    :param entries: (universityID, name, image_bytes) tuples.
+    :return: one result dict per entry, in order. The batch is appended to the gallery's log in one write.
+    """
+    results, enrolled = [], []
+    for (universityID, name, _), embedding in zip(entries, embed_image_bytes([image_bytes for _, _, image_bytes in entries])):
+        if embedding is None:
+            results.append({"status": "error", "message": "No usable face in registration image."})
+            continue
+        enrolled.append((universityID, name, embedding))
+        results.append({"status": "success", "message": "Voter face enrolled."})
+
+    enroll_voter_embeddings(enrolled)
+    return results
+
+def enroll_voter_embeddings(entries):
+    """
+    Adds precomputed (universityID, name, embedding) entries to the gallery and appends them to its log,
+    so persisting a batch costs O(batch). The gallery is only rewritten once the log outgrows it.
+    Safe across API workers: appends and rewrites of the gallery file take turns on its write lock.
+    """
+    if not entries:
+        return
+    matcher = get_voter_matcher()
+    trained_on = getattr(matcher.index, "trained_on", None)
+    while not matcher.gallery.append(VOTER_GALLERY_PATH, entries, add=matcher.add):
+        reload_voter_gallery()  # Another worker rewrote the gallery: enroll into its version instead
+        matcher = voter_matcher
+        trained_on = getattr(matcher.index, "trained_on", None)
+
+    with matcher.gallery.writing(VOTER_GALLERY_PATH):
+        # Only this worker's view may be folded into a rewrite, so first apply what others appended
+        if matcher.gallery.catch_up(VOTER_GALLERY_PATH, add=matcher.add) and matcher.gallery.needs_compaction:
+            publish_voter_matcher(matcher, new_version())
+        elif getattr(matcher.index, "trained_on", None) != trained_on:
+            matcher.index.save(VOTER_INDEX_PATH)  # Retrained as the gallery grew; later rows are re-bucketed on load
+
+# ✅ Load One Voter's Enrolled Template From `voters.db`
+def load_voter_template(universityID):
+    """Embeds the stored registration photo of a single voter, or returns None."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT face_images.image FROM voters JOIN face_images ON face_images.hash = voters.image_hash WHERE voters.universityID=?",
+        (universityID,),
+    )
+    row = cursor.fetchone()
+
+    if row is None:
+        return None
+    return embed_image_bytes([row[0]])[0]
 
-                if dist < best_distance:
-                    best_distance = dist
-                    best_match = universityID
+# ✅ 1:1 Face Verification Against a Claimed Identity
+@reports_version(lambda: voter_matcher)
+def verify_face(image_array, universityID, threshold=MATCH_DISTANCE_THRESHOLD, matcher=None):
+    """Checks that a face in `image_array` belongs to `universityID` without searching the whole gallery."""
+    try:
+        analysis = as_face_analysis(image_array)
+        if analysis.is_blurry():
+            return {"status": "error", "message": "Image is too blurry for recognition. Use a clearer image."}
 
-            if best_match and best_distance < 0.6:
-                return {"status": "success", "recognized_user": {"universityID": best_match, "message": "Fallback recognition successful"}}
+        if len(analysis.faces) == 0:
+            return {"status": "error", "message": "No face detected"}
 
-        return {"status": "error", "message": "No similar face found"}
+        face_embeddings = analysis.embeddings
+
+        # ✅ Prefer the gallery template; fall back to this voter's stored photo only
+        distance = matcher.distance_to(universityID, face_embeddings) if matcher is not None else None
+        if distance is None:
+            template = load_voter_template(universityID)
+            if template is None:
+                return {"status": "error", "message": "No enrolled face found for this voter."}
+            distance = float(np.min(np.linalg.norm(face_embeddings - template, axis=1)))
+
+        if distance >= threshold:
+            logging.info(f"📏 Verification failed for voter {universityID} (distance {distance:.3f})")
+            return {"status": "error", "message": "Face does not match the registered voter."}
+
+        return {
+            "status": "success",
+            "verified_user": {
+                "universityID": universityID,
+                "confidence": round(1 - distance, 2),
+                "distance": round(distance, 4)
+            }
+        }
 
     except Exception as e:
-        return {"status": "error", "message": f"Error in fallback recognition: {str(e)}"}
-
+        return {"status": "error", "message": f"Face verification error: {str(e)}"}
 
 def recognize_face_base64(image_base64: str):
     """Recognizes a face from a Base64-encoded image."""
     try:
         # Decode Base64 image
-        image_bytes = base64.b64decode(image_base64)
-        np_arr = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+        image = decode_image(base64.b64decode(image_base64))
 
         if image is None:
             return {"status": "error", "message": "Invalid base64 image format"}
@@ -2,24 +2,21 @@ import cv2
 import dlib
 import numpy as np
 import time
+from backend.services.faceDetectorService import detect_faces
+from backend.services.faceAnalysisService import as_face_analysis
+from backend.services.modelRegistryService import get_model
 
 
-# ✅ Load Face Detector & Landmark Predictor
-PREDICTOR_PATH = "backend/models/shape_predictor_68_face_landmarks.dat"
-face_detector = dlib.get_frontal_face_detector()
-landmark_predictor = dlib.shape_predictor(PREDICTOR_PATH)
-
 def is_live_face(image):
-    """Detects blinking for liveness verification."""
+    """Detects blinking for liveness verification (BGR image or shared FaceAnalysis)."""
     try:
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        faces = face_detector(gray)
+        analysis = as_face_analysis(image, site="liveness")
 
-        if len(faces) == 0:
+        if len(analysis.faces) == 0:
             return {"status": "error", "message": "❌ No face detected"}
 
-        for face in faces:
-            landmarks = landmark_predictor(gray, face)
+        for index in range(len(analysis.faces)):
+            landmarks = analysis.landmarks(index)
 
             left_eye = (landmarks.part(36).x, landmarks.part(36).y)
             right_eye = (landmarks.part(45).x, landmarks.part(45).y)
@@ -47,10 +44,10 @@ def detect_head_movement():
             break
 
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_detector(gray)
+        faces = detect_faces(gray, site="liveness")
 
         for face in faces:
-            landmarks = landmark_predictor(gray, face)
+            landmarks = get_model("predictor")(gray, face)
             nose_x = landmarks.part(30).x  # Nose tip position
 
             if "prev_nose_x" in locals():
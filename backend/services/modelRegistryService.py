@@ -0,0 +1,103 @@
+import os
+import time
+import logging
+import threading
+import cv2
+import dlib
+import numpy as np
+
+# 📌 Paths
+CNN_MODEL_PATH = "backend/models/mmod_human_face_detector.dat"
+FACE_REC_MODEL_PATH = "backend/models/dlib_face_recognition_resnet_model_v1.dat"
+PREDICTOR_PATH = "backend/models/shape_predictor_68_face_landmarks.dat"
+SSD_MODEL_PATH = "backend/Model/opencv_face_detector_uint8.pb"
+SSD_CONFIG_PATH = "backend/Model/opencv_face_detector.pbtxt"
+
+# ✅ Models Preloaded (and warmed up) at API Startup
+PRELOAD_MODELS = [name.strip() for name in os.getenv("UNIVOTE_PRELOAD_MODELS", "ssd,mmod,predictor,recognizer").split(",") if name.strip()]
+
+
+# ✅ Loaders (name → files, constructor, download hint)
+def _load_ssd():
+    return cv2.dnn.readNetFromTensorflow(SSD_MODEL_PATH, SSD_CONFIG_PATH)
+
+
+MODEL_SPECS = {
+    "ssd": ([SSD_MODEL_PATH, SSD_CONFIG_PATH], _load_ssd, "the OpenCV face detector files in backend/Model"),
+    "hog": ([], dlib.get_frontal_face_detector, None),
+    "mmod": ([CNN_MODEL_PATH], lambda: dlib.cnn_face_detection_model_v1(CNN_MODEL_PATH), "http://dlib.net/files/mmod_human_face_detector.dat.bz2"),
+    "predictor": ([PREDICTOR_PATH], lambda: dlib.shape_predictor(PREDICTOR_PATH), "http://dlib.net/files/shape_predictor_68_face_landmarks.dat.bz2"),
+    "recognizer": ([FACE_REC_MODEL_PATH], lambda: dlib.face_recognition_model_v1(FACE_REC_MODEL_PATH), "http://dlib.net/files/dlib_face_recognition_resnet_model_v1.dat.bz2"),
+}
+
+_models = {}
+_load_seconds = {}
+_lock = threading.Lock()
+
+
+# ✅ Get a Model, Loading It Once per Process
+def get_model(name):
+    """Returns the shared instance of model `name`, loading it on first use."""
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    if name not in MODEL_SPECS:
+        raise ValueError(f"Unknown model '{name}'. Choose from {sorted(MODEL_SPECS)}.")
+
+    with _lock:
+        if name not in _models:
+            paths, loader, source = MODEL_SPECS[name]
+            missing = [path for path in paths if not os.path.exists(path)]
+            if missing:
+                raise FileNotFoundError(f"⚠️ Model '{name}' missing ({', '.join(missing)})! Download from {source}")
+
+            start = time.perf_counter()
+            _models[name] = loader()
+            _load_seconds[name] = time.perf_counter() - start
+            logging.info(f"✅ Loaded model '{name}' in {_load_seconds[name]:.2f}s")
+    return _models[name]
+
+
+def is_loaded(name):
+    return name in _models
+
+
+# ✅ Explicit Preload & Warmup
+def preload(names=None):
+    """Loads the given models (default: UNIVOTE_PRELOAD_MODELS) so the first request does not pay for it."""
+    for name in names if names is not None else PRELOAD_MODELS:
+        get_model(name)
+
+
+def warmup(names=None):
+    """Runs one dummy inference per model so lazy allocations happen before traffic arrives."""
+    names = names if names is not None else PRELOAD_MODELS
+    image = np.zeros((150, 150, 3), dtype=np.uint8)
+    box = dlib.rectangle(0, 0, 149, 149)
+
+    for name in names:
+        model = get_model(name)
+        if name == "ssd":
+            model.setInput(cv2.dnn.blobFromImage(image, 1.0, (300, 300), (104.0, 177.0, 123.0)))
+            model.forward()
+        elif name in ("hog", "mmod"):
+            model(image)
+        elif name == "predictor":
+            model(image, box)
+        elif name == "recognizer":
+            model.compute_face_descriptor(image, get_model("predictor")(image, box))
+    logging.info(f"🔥 Warmed up models: {', '.join(names)}")
+
+
+# ✅ Memory Footprint
+def memory_footprint():
+    """Approximate resident size of each loaded model (its weight files) plus load times."""
+    models = {}
+    for name in list(_models):
+        paths = MODEL_SPECS[name][0]
+        models[name] = {
+            "bytes": sum(os.path.getsize(path) for path in paths if os.path.exists(path)),
+            "load_seconds": round(_load_seconds.get(name, 0.0), 3),
+        }
+    return {"models": models, "total_bytes": sum(model["bytes"] for model in models.values())}
@@ -2,10 +2,12 @@ import sqlite3
 import logging
 import os
 import hashlib
-from datetime import datetime
 from fastapi.responses import JSONResponse
 import cv2
-from backend.services.faceRecognitionService import recognize_face  # ✅ FIXED: Import correct function
+from backend.services.faceRecognitionService import verify_face  # ✅ 1:1 check against the claimed voter
+from backend.services.faceDetectorService import read_image
+from backend.services.databaseService import get_connection
+from backend.services.voteWriterService import vote_writer, vote_tally, VOTE_RECORDED, VOTE_ALREADY_CAST, VOTE_UNKNOWN_VOTER
 
 # ✅ Ensure log directory exists
 LOG_DIR = "backend/logs"
@@ -42,7 +44,7 @@ vote_logger.info("✅ Logging system initialized successfully!")
 DATABASE = "backend/data/voters.db"
 
 def initialize_database():
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection()
     cursor = conn.cursor()
     
     # ✅ Ensure `voters` table exists
@@ -54,7 +56,7 @@ def initialize_database():
             email TEXT,
             password TEXT,
             hasVoted INTEGER DEFAULT 0,
-            image BLOB
+            image_hash TEXT
         )
     """)
 
@@ -69,7 +71,6 @@ def initialize_database():
     """)
 
     conn.commit()
-    conn.close()
     print("✅ Database initialized successfully")
 
 
@@ -86,58 +87,44 @@ def flush_logs():
 
 # ✅ **Check if Voter Exists**
 def voter_exists(universityID):
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT universityID FROM voters WHERE universityID=?", (universityID,))
     result = cursor.fetchone()
-    conn.close()
     return result is not None
 
 # ✅ **Check if Voter has Already Voted**
 def check_has_voted(universityID):
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT hasVoted FROM voters WHERE universityID=?", (universityID,))
     result = cursor.fetchone()
-    conn.close()
     return result is not None and result[0] == 1
 
 # ✅ **Update Voting Status**
 def update_voting_status(universityID, status=True):
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("UPDATE voters SET hasVoted=? WHERE universityID=?", (1 if status else 0, universityID))
     conn.commit()
-    conn.close()
 
     # ✅ Log Voter Status Update with Hashed ID
     vote_logger.info(f"✅ Voter status updated: UniversityID={hash_value(universityID)}, hasVoted={status}")
     flush_logs()
 
-# ✅ **Record Vote in Database**
-def record_vote(universityID, candidateID):
-    """🗳 Securely store vote in database (Raw Data) and log Hashed Data."""
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    try:
-        cursor.execute("INSERT INTO votes (universityID, candidateID, timestamp) VALUES (?, ?, ?)", 
-                       (universityID, candidateID, timestamp))
-        conn.commit()
-
-        # ✅ Log Secure Hashed Vote Information
-        hashed_voter = hash_value(universityID)
-        hashed_candidate = hash_value(candidateID)
-
-        vote_logger.info(f"✅ Vote recorded: UniversityID={hashed_voter}, CandidateID={hashed_candidate}")
-        flush_logs()
-
-    except sqlite3.Error as e:
-        vote_logger.error(f"❌ Error recording vote for {hash_value(universityID)}: {str(e)}")
+# ✅ **Record Vote (group-committed with concurrent votes, atomic per voter)**
+def record_vote_once(universityID, candidateID):
+    """
+    🗳 Hands the vote to the group-commit writer and waits until its batch is committed.
+    :return: VOTE_RECORDED, VOTE_ALREADY_CAST or VOTE_UNKNOWN_VOTER
+    """
+    outcome = vote_writer.write(universityID, candidateID)
+
+    # ✅ Log Secure Hashed Vote Information
+    if outcome == VOTE_RECORDED:
+        vote_logger.info(f"✅ Vote recorded: UniversityID={hash_value(universityID)}, CandidateID={hash_value(candidateID)}")
         flush_logs()
-    finally:
-        conn.close()
+    return outcome
 
 # ✅ **Cast Vote Function**
 def cast_vote(vote_data):
@@ -147,35 +134,35 @@ def cast_vote(vote_data):
         if not voter_exists(vote_data["universityID"]):
             return {"status": "error", "message": "Voter does not exist in the database."}
 
-        # 🛑 **2. Prevent Duplicate Votes**
+        # 🛑 **2. Reject Known Duplicates Early (final check is atomic, in step 4)**
         if check_has_voted(vote_data["universityID"]):
             vote_logger.warning(f"⚠️ Duplicate vote attempt by UniversityID={hash_value(vote_data['universityID'])}")
             flush_logs()
             return {"status": "error", "message" : "User has already voted."}
             
            
-        # 🎭 **3. Verify Face Using CNN & KNN**
+        # 🎭 **3. Verify Face Against the Claimed Voter's Template (1:1)**
         image_path = vote_data["image_path"]  # Use saved image path
-        input_image = cv2.imread(image_path)
+        input_image = read_image(image_path)
 
         if input_image is None:
             return {"status": "error", "message": "Failed to read image file."}
 
-        recognition_result = recognize_face(input_image)  # Call face recognition function
+        verification_result = verify_face(input_image, vote_data["universityID"])
 
-        if recognition_result["status"] != "success":
+        if verification_result["status"] != "success":
             vote_logger.warning(f"⚠️ Face mismatch for UniversityID={hash_value(vote_data['universityID'])}")
             flush_logs()
-            return {"status": "error", "message": recognition_result["message"]}
-
-        recognized_user_id = recognition_result["recognized_user"]["universityID"]
+            return {"status": "error", "message": verification_result["message"]}
 
-        if recognized_user_id != vote_data["universityID"]:
-            return {"status": "error", "message": "Face does not match the registered voter."}
-
-        # 🗳️ **4. Record Vote and Update Status**
-        record_vote(vote_data["universityID"], vote_data["candidateID"])
-        update_voting_status(vote_data["universityID"], True)
+        # 🗳️ **4. Record Vote and Update Status in One Transaction**
+        outcome = record_vote_once(vote_data["universityID"], vote_data["candidateID"])
+        if outcome == VOTE_ALREADY_CAST:
+            vote_logger.warning(f"⚠️ Duplicate vote attempt by UniversityID={hash_value(vote_data['universityID'])}")
+            flush_logs()
+            return {"status": "error", "message": "User has already voted."}
+        if outcome == VOTE_UNKNOWN_VOTER:
+            return {"status": "error", "message": "Voter does not exist in the database."}
 
         vote_logger.info(f"✅ Vote successfully cast by UniversityID={hash_value(vote_data['universityID'])}")
         flush_logs()
@@ -187,15 +174,12 @@ def cast_vote(vote_data):
         return {"status": "error", "message": "An error occurred while casting vote."}
 
 # ✅ **Retrieve Election Results**
-def get_results():
-    """📊 Fetch election results securely."""
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT candidateID, COUNT(*) FROM votes GROUP BY candidateID")
-    results = cursor.fetchall()
-    conn.close()
-
-    results_dict = {candidate: count for candidate, count in results}
-    vote_logger.info("✅ Election results retrieved successfully.")
-    flush_logs()
-    return {"status": "success", "results": results_dict} 
\ No newline at end of file
+def get_results(since_version=None):
+    """
+    📊 Election results from the in-memory tally snapshot (never scans `votes`).
+    When `since_version` equals the current version the results are omitted (`not_modified`).
+    """
+    version, results = vote_tally.get()
+    if since_version is not None and since_version == version:
+        return {"status": "not_modified", "version": version}
+    return {"status": "success", "version": version, "results": dict(results)}
@@ -0,0 +1,193 @@
+import os
+import time
+import logging
+import threading
+from collections import deque, Counter
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime
+import numpy as np
+from backend.services.databaseService import get_connection, transaction
+from backend.services.faceBatchService import MicroBatcher
+
+# ✅ Group-Commit Limits
+#    Votes arriving together are committed in one transaction of up to VOTE_BATCH_MAX_SIZE rows, at most
+#    VOTE_BATCH_MAX_WAIT_MS after the first one arrived, so a burst pays one fsync per batch instead of per vote.
+VOTE_GROUP_COMMIT = os.getenv("UNIVOTE_VOTE_GROUP_COMMIT", "1") == "1"
+VOTE_BATCH_MAX_SIZE = int(os.getenv("UNIVOTE_VOTE_BATCH_MAX_SIZE", "128"))
+VOTE_BATCH_MAX_WAIT_MS = float(os.getenv("UNIVOTE_VOTE_BATCH_MAX_WAIT_MS", "10"))
+VOTE_SYNCHRONOUS = os.getenv("UNIVOTE_VOTE_SYNCHRONOUS", "FULL")  # fsync every vote commit, not only at checkpoints
+VOTE_WRITE_TIMEOUT = float(os.getenv("UNIVOTE_VOTE_WRITE_TIMEOUT", "30"))  # Longest a request waits for its batch
+VOTE_LATENCY_SAMPLES = 10000       # Most recent votes kept for the latency percentiles
+VOTE_THROUGHPUT_WINDOW = 10.0      # Seconds of completions averaged into votes/s
+
+# ✅ Vote Outcomes
+VOTE_RECORDED = "recorded"
+VOTE_ALREADY_CAST = "already_voted"
+VOTE_UNKNOWN_VOTER = "unknown_voter"
+
+
+# ✅ Running Tally (one row per candidate, updated in the same transaction as the votes)
+def initialize_tallies():
+    """Creates `tallies` and, the first time, backfills it from `votes`."""
+    with transaction(immediate=True) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS votes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                universityID TEXT,
+                candidateID TEXT,
+                timestamp TEXT
+            )
+        """)
+        conn.execute("CREATE TABLE IF NOT EXISTS tallies (candidateID TEXT PRIMARY KEY, votes INTEGER NOT NULL)")
+        if conn.execute("SELECT 1 FROM tallies LIMIT 1").fetchone() is None:
+            conn.execute("INSERT INTO tallies (candidateID, votes) SELECT candidateID, COUNT(*) FROM votes GROUP BY candidateID")
+
+
+class TallySnapshot:
+    """
+    In-memory copy of `tallies`. Votes only ever add, so the total number of votes doubles as the
+    snapshot version: it changes exactly when a result changes. Every read compares it with the
+    table's total, which picks up votes from this and every other API worker alike. `tallies` is
+    created at startup (`initialize_tallies`); reading it never takes a write lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results = None
+        self._version = 0
+
+    def load(self):
+        # One statement, so the rows and the version derived from them are one consistent read
+        rows = get_connection().execute("SELECT candidateID, votes FROM tallies").fetchall()
+        results = dict(rows)
+        with self._lock:
+            self._results = results
+            self._version = sum(results.values())
+
+    def get(self):
+        """(version, {candidateID: votes}) — the dict must not be modified."""
+        # One aggregate over `tallies` (O(#candidates), `votes` untouched) detects new commits
+        committed = get_connection().execute("SELECT COALESCE(SUM(votes), 0) FROM tallies").fetchone()[0]
+        with self._lock:
+            stale = self._results is None or committed != self._version
+        if stale:
+            self.load()
+        with self._lock:
+            return self._version, self._results
+
+
+vote_tally = TallySnapshot()
+
+
+# ✅ Record a Batch of Votes in One Transaction
+def record_votes(votes):
+    """
+    For each (universityID, candidateID): flips `hasVoted` 0 → 1 and inserts the vote, all inside one
+    BEGIN IMMEDIATE transaction. The conditional UPDATE is the duplicate check, so a second vote by the
+    same voter (in this batch or any other) records nothing. `tallies` is bumped in the same transaction.
+    :return: one of VOTE_RECORDED, VOTE_ALREADY_CAST, VOTE_UNKNOWN_VOTER per vote, in order.
+    """
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    outcomes, rows = [], []
+    with transaction(immediate=True) as conn:
+        for universityID, candidateID in votes:
+            claimed = conn.execute("UPDATE voters SET hasVoted=1 WHERE universityID=? AND hasVoted=0", (universityID,)).rowcount
+            if claimed:
+                rows.append((universityID, candidateID, timestamp))
+                outcomes.append(VOTE_RECORDED)
+            elif conn.execute("SELECT 1 FROM voters WHERE universityID=?", (universityID,)).fetchone():
+                outcomes.append(VOTE_ALREADY_CAST)
+            else:
+                outcomes.append(VOTE_UNKNOWN_VOTER)
+        counts = Counter(candidateID for _, candidateID, _ in rows)
+        conn.executemany("INSERT INTO votes (universityID, candidateID, timestamp) VALUES (?, ?, ?)", rows)
+        conn.executemany(
+            "INSERT INTO tallies (candidateID, votes) VALUES (?, ?) ON CONFLICT(candidateID) DO UPDATE SET votes = votes + excluded.votes",
+            list(counts.items()),
+        )
+    return outcomes
+
+
+class VoteWriter:
+    """
+    Single writer for votes. Request threads block in `write` until the batch holding their vote is
+    committed (at most VOTE_WRITE_TIMEOUT seconds), then get that vote's outcome; the batch itself
+    runs on one background thread.
+    """
+
+    def __init__(self, group_commit=VOTE_GROUP_COMMIT, max_batch=VOTE_BATCH_MAX_SIZE, max_wait_ms=VOTE_BATCH_MAX_WAIT_MS):
+        self.group_commit = group_commit
+        self._batcher = MicroBatcher(self._commit_batch, "vote-writer", max_batch, max_wait_ms)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=VOTE_LATENCY_SAMPLES)  # (completed_at, seconds)
+        self._batches = 0
+        self._votes = 0
+        self._failed_batches = 0
+        self._commit_seconds = 0.0
+
+    # ✅ Write One Vote (returns once it is durable)
+    def write(self, universityID, candidateID):
+        start = time.perf_counter()
+        try:
+            if self.group_commit:
+                future = self._batcher.submit((universityID, candidateID))
+                try:
+                    return future.result(timeout=VOTE_WRITE_TIMEOUT)
+                except FutureTimeoutError:
+                    if future.cancel():
+                        raise TimeoutError("Vote writer is stalled; the vote was not recorded.")
+                    raise TimeoutError("Vote commit is taking too long; its outcome is not known yet.")
+            return self._commit_batch([(universityID, candidateID)])[0]
+        finally:
+            done = time.perf_counter()
+            with self._lock:
+                self._latencies.append((done, done - start))
+
+    def _commit_batch(self, votes):
+        if not getattr(self._local, "tuned", False):
+            initialize_tallies()
+            get_connection().execute(f"PRAGMA synchronous={VOTE_SYNCHRONOUS}")
+            self._local.tuned = True
+
+        start = time.perf_counter()
+        try:
+            outcomes = record_votes(votes)
+        except Exception:
+            with self._lock:
+                self._failed_batches += 1
+            raise
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._batches += 1
+            self._votes += len(votes)
+            self._commit_seconds += elapsed
+        logging.debug(f"🗳️ Committed {len(votes)} vote(s) in {elapsed * 1000:.1f} ms")
+        return outcomes
+
+    # ✅ Throughput & Latency Metrics (for tuning the batching window)
+    def stats(self):
+        now = time.perf_counter()
+        with self._lock:
+            latencies = np.array([seconds for _, seconds in self._latencies]) * 1000
+            recent = sum(1 for completed_at, _ in self._latencies if now - completed_at <= VOTE_THROUGHPUT_WINDOW)
+            return {
+                "group_commit": self.group_commit,
+                "max_batch": self._batcher.max_batch,
+                "max_wait_ms": self._batcher.max_wait * 1000,
+                "batches": self._batches,
+                "votes": self._votes,
+                "failed_batches": self._failed_batches,
+                "avg_batch_size": round(self._votes / self._batches, 2) if self._batches else None,
+                "avg_commit_ms": round(self._commit_seconds / self._batches * 1000, 3) if self._batches else None,
+                "throughput_per_second": round(recent / VOTE_THROUGHPUT_WINDOW, 2),
+                "latency_ms": {
+                    "samples": len(latencies),
+                    "p50": round(float(np.percentile(latencies, 50)), 3) if len(latencies) else None,
+                    "p99": round(float(np.percentile(latencies, 99)), 3) if len(latencies) else None,
+                    "max": round(float(latencies.max()), 3) if len(latencies) else None,
+                },
+            }
+
+
+vote_writer = VoteWriter()
@@ -7,12 +7,13 @@ import os
 import numpy as np
 import cv2
 import subprocess
+from backend.services.faceRecognitionService import rebuild_voter_gallery
+from backend.services.enrollmentQueueService import enrollment_worker
+from backend.services.databaseService import get_connection, store_face_image
 
 
 # ✅ Paths
 DATABASE_PATH = "backend/data/voters.db"
-FACES_DATA_PATH = "backend/data/voter_faces.pkl"
-NAMES_DATA_PATH = "backend/data/voter_names.pkl"
 
 # ✅ Logging Setup
 LOG_DIR = "backend/logs"
@@ -36,7 +37,7 @@ logging.info("✅ Logging initialized successfully.")
 # ✅ Ensure Database Exists
 def initialize_database():
     os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
-    with sqlite3.connect(DATABASE_PATH) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS voters (
@@ -46,7 +47,7 @@ def initialize_database():
                 email TEXT,
                 password TEXT,
                 hasVoted INTEGER DEFAULT 0,
-                image BLOB
+                image_hash TEXT
             )
         """)
         conn.commit()
@@ -61,7 +62,7 @@ def hash_password(password):
 # ✅ Check if Voter Exists
 def check_voter_exists(universityID):
     try:
-        with sqlite3.connect(DATABASE_PATH) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT universityID FROM voters WHERE universityID=?", (universityID,))
             return cursor.fetchone() is not None
@@ -98,14 +99,14 @@ def register_new_voter(voter_data):
             logging.error(f"❌ Error decoding image: {str(e)}")
             return {"status": "error", "message": "Invalid image format."}
 
-        # ✅ Insert voter data into database
-        with sqlite3.connect(DATABASE_PATH) as conn:
+        # ✅ Insert voter data into database (the photo goes to the shared image store)
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO voters (universityID, firstname, lastname, email, password, hasVoted, image)
+                INSERT INTO voters (universityID, firstname, lastname, email, password, hasVoted, image_hash)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
             """, (voter_data["universityID"], voter_data["firstname"], voter_data["lastname"], 
-                  voter_data["email"], hashed_password, 0, image_data))
+                  voter_data["email"], hashed_password, 0, store_face_image(conn, image_data)))
             conn.commit()
 
             # ✅ Verify if the voter was actually inserted
@@ -117,41 +118,33 @@ def register_new_voter(voter_data):
 
         logging.info(f"✅ Voter registered successfully: {voter_data['universityID']}")
 
-         # ✅ **Automatically Update KNN Model**
-        update_result = update_face_dataset_and_train()
-        logging.info(f"🔄 Model update result: {update_result}")
+        # ✅ Queue face enrollment; the background worker embeds registrations in batches
+        job_id = enrollment_worker.submit(voter_data["universityID"], f"{voter_data['firstname']} {voter_data['lastname']}")
+        logging.info(f"🧬 Queued gallery enrollment job {job_id}")
 
-        return {"status": "success", "message": "Voter registered successfully!"}
+        return {"status": "success", "message": "Voter registered successfully!", "enrollment_job": job_id}
 
     except sqlite3.Error as e:
         logging.error(f"❌ Database Error while registering voter {voter_data['universityID']}: {str(e)}")
         return {"status": "error", "message": "Database error while registering."}
 
-# ✅ Automatically Update Dataset & Train KNN Model
+# ✅ Rebuild the Voter Gallery & Index From Scratch (on demand)
 def update_face_dataset_and_train():
-    """Updates only voter-related .pkl files and retrains the voter-specific KNN model."""
+    """Re-embeds every stored voter face. Registration does not call this; it enrolls incrementally."""
     try:
-        logging.info("🔄 Updating voter dataset...")
+        logging.info("🔄 Rebuilding voter gallery...")
+        result = rebuild_voter_gallery()
+        logging.info(f"✅ {result['message']}")
+        return result
 
-        # ✅ Run add_faces.py but ONLY for voters
-        subprocess.run(["python", "backend/scripts/add_faces.py", "--only-voters"], check=True)
-
-        logging.info("🔄 Retraining KNN model for VOTERS ONLY...")
-
-        # ✅ Train only the voter KNN model
-        subprocess.run(["python", "backend/scripts/train_knn.py", "--only-voters"], check=True)
-
-        logging.info("✅ Voter dataset updated & model retrained successfully!")
-        return {"status": "success", "message": "Voter model updated successfully!"}
-
-    except subprocess.CalledProcessError as e:
-        logging.error(f"❌ Error during model update: {str(e)}")
-        return {"status": "error", "message": "Voter registered, but model update failed."}
+    except Exception as e:
+        logging.error(f"❌ Error during voter gallery rebuild: {str(e)}")
+        return {"status": "error", "message": "Voter gallery rebuild failed."}
 
 
 # ✅ Retrieve Voter Details
 def get_voter_details(universityID):
-    with sqlite3.connect(DATABASE_PATH) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT firstname, lastname, email, hasVoted FROM voters WHERE universityID=?", (universityID,))
         result = cursor.fetchone()
@@ -163,7 +156,7 @@ def get_voter_details(universityID):
 
 # ✅ Check If Voter Has Voted
 def check_has_voted(universityID):
-    with sqlite3.connect(DATABASE_PATH) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT hasVoted FROM voters WHERE universityID=?", (universityID,))
         return cursor.fetchone()[0] == 1 if cursor.fetchone() else False
@@ -174,7 +167,7 @@ def update_voting_status(universityID, status=True):
     Marks a voter as 'hasVoted' after they cast their vote.
     """
     try:
-        with sqlite3.connect(DATABASE_PATH) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 "UPDATE voters SET hasVoted=? WHERE universityID=?", 
@@ -0,0 +1,84 @@
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ✅ Worker Pool Limits
+#    Threads share the models loaded once at import; OpenCV and dlib's batched inference do the
+#    heavy lifting in native code, so the event loop stays free while requests are processed.
+RECOGNITION_WORKERS = int(os.getenv("UNIVOTE_RECOGNITION_WORKERS", str(min(8, os.cpu_count() or 1))))
+RECOGNITION_TIMEOUT = float(os.getenv("UNIVOTE_RECOGNITION_TIMEOUT", "30"))
+NO_TIMEOUT = float("inf")  # For work that must not be reported as failed while it may still complete (votes)
+
+
+class RecognitionPool:
+    """Runs blocking recognition / vote work on worker threads and lets async routes await it."""
+
+    def __init__(self, workers=RECOGNITION_WORKERS, timeout=RECOGNITION_TIMEOUT):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="recognition")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._timed_out = 0
+
+    # ✅ Await a Blocking Call Without Blocking the Event Loop
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        """
+        Runs `fn(*args, **kwargs)` on a worker thread.
+        :raises TimeoutError: if no result arrives within `timeout` seconds (pool default if None;
+            NO_TIMEOUT waits for the result however long it takes).
+        """
+        with self._lock:
+            self._queued += 1
+
+        def task():
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+
+        future = self._executor.submit(task)
+        if timeout == NO_TIMEOUT:
+            return await asyncio.wrap_future(future)
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout if timeout is not None else self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timed_out += 1
+                # Drop work that never started; a running call cannot be interrupted
+                if future.cancel():
+                    self._queued -= 1
+            logging.warning(f"⏱️ {getattr(fn, '__name__', 'task')} exceeded {timeout or self.timeout}s in the recognition pool")
+            raise TimeoutError("Recognition request timed out.")
+
+    # ✅ Queue-Depth Metrics
+    @property
+    def queue_depth(self):
+        return self._queued
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "timed_out": self._timed_out,
+            }
+
+
+recognition_pool = RecognitionPool()
+
+
+async def run_in_pool(fn, *args, **kwargs):
+    """Shortcut for `recognition_pool.run`."""
+    return await recognition_pool.run(fn, *args, **kwargs)
@@ -2,3 +2,12 @@ import base64
 
 def decode_image(image_data):
     return base64.b64decode(image_data)
+
+def save_pickle_atomic(obj, path):
+    """Pickles `obj` to a temporary file and renames it over `path`, so readers never see a partial file."""
+    import os
+    import pickle
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(obj, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource  # Unix only; peak RSS is reported as None elsewhere
+except ImportError:
+    resource = None
+
+# ✅ Profiler Active in This Process (None → `profile_stage` is a no-op)
+_active = None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its reaped children, in MiB."""
+    if resource is None:
+        return {"self": None, "children": None}
+    scale = 1 / (1024 * 1024) if sys.platform == "darwin" else 1 / 1024  # ru_maxrss: bytes on macOS, KiB on Linux
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale, 1),
+    }
+
+
+class StageProfiler:
+    """Accumulates wall time and item counts per named stage; stages may repeat (e.g. once per table)."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, items=0):
+        """Times the enclosed block. `items` (or `record["items"]` set inside the block) drives images/s."""
+        record = {"items": items}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stage = self._stages.setdefault(name, {"seconds": 0.0, "items": 0, "calls": 0})
+                stage["seconds"] += elapsed
+                stage["items"] += record["items"]
+                stage["calls"] += 1
+
+    def report(self):
+        with self._lock:
+            stages = {
+                name: {
+                    "seconds": round(stage["seconds"], 4),
+                    "items": stage["items"],
+                    "calls": stage["calls"],
+                    "items_per_second": round(stage["items"] / stage["seconds"], 2) if stage["items"] and stage["seconds"] > 0 else None,
+                }
+                for name, stage in self._stages.items()
+            }
+        return {
+            "script": self.name,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "wall_seconds": round(time.time() - self.started, 4),
+            "argv": sys.argv[1:],
+            "stages": stages,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    def save(self, path):
+        """Writes the JSON report atomically and logs a one-line summary per stage."""
+        report = self.report()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_path, path)
+
+        for name, stage in report["stages"].items():
+            rate = f", {stage['items_per_second']} img/s" if stage["items_per_second"] else ""
+            logging.info(f"⏱️ {name}: {stage['seconds']}s over {stage['items']} item(s){rate}")
+        logging.info(f"⏱️ Peak RSS {report['peak_rss_mb']['self']} MiB; profile written to {path}")
+        return report
+
+
+def activate(name):
+    """Starts profiling this process; library code reports into it through `profile_stage`."""
+    global _active
+    _active = StageProfiler(name)
+    return _active
+
+
+@contextmanager
+def profile_stage(name, items=0):
+    """`StageProfiler.stage` on the active profiler, or a no-op block when none is active."""
+    if _active is None:
+        yield {"items": items}
+        return
+    with _active.stage(name, items) as record:
+        yield record